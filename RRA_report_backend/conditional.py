@@ -0,0 +1,63 @@
+"""
+Conditional GET support (ETag / Last-Modified) for report and user views.
+
+A view's validators come from a cheap query over the rows it would return:
+the newest updated_at and the row count for a collection, the row's own
+updated_at for a single object. When the client already holds that version
+the view answers 304 Not Modified without loading or serializing anything.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def newest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def collection_state(queryset, *parts, related=()):
+    """
+    (etag, last_modified) of `queryset` from one aggregate query, plus one
+    indexed max(updated_at) lookup per model in `related` whose rows are
+    embedded in the response (e.g. report creators).
+    """
+    state = queryset.aggregate(updated=Max('updated_at'), count=Count('pk'))
+    related_updated = [model.objects.aggregate(updated=Max('updated_at'))['updated'] for model in related]
+    return (
+        make_etag(queryset.model._meta.label_lower, state['updated'], state['count'], *related_updated, *parts),
+        newest(state['updated'], *related_updated),
+    )
+
+
+def conditional_get(state):
+    """
+    Decorate a view's get() with conditional request handling. `state`
+    returns the (etag, last_modified) pair for the request, or None when
+    the view should simply run (e.g. the object does not exist).
+    """
+    def decorator(get):
+        @wraps(get)
+        def conditional(view, request, *args, **kwargs):
+            validators = state(view, request, *args, **kwargs)
+            if validators is None:
+                return get(view, request, *args, **kwargs)
+            etag, last_modified = validators
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = get(view, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers['ETag'] = etag
+                if timestamp is not None:
+                    response.headers['Last-Modified'] = http_date(timestamp)
+            return response
+        return conditional
+    return decorator
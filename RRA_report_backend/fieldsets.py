@@ -0,0 +1,129 @@
+"""
+Sparse fieldsets for report and user reads: ?fields= and ?expand=.
+
+    ?fields=id,title,level,status,created_date
+    ?fields=id,title&expand=created_by
+
+?fields= limits each object to the named fields. Nested objects (a
+report's creator) are left out of a sparse response unless they are named
+in ?fields= or ?expand=. The view pushes the same selection into the ORM
+with only() and drops joins nobody asked for, so unused columns such as
+report descriptions are never read. Without ?fields= nothing changes.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def parse_names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def requested_fields(request, fields):
+    """
+    Names of `fields` selected by the request, in declaration order, or
+    None when the full representation was asked for.
+    """
+    if request is None or request.method not in READ_METHODS:
+        return None
+    params = request.query_params
+    names = parse_names(params.get('fields'))
+    expand = parse_names(params.get('expand'))
+
+    nested = [name for name, field in fields.items() if isinstance(field, serializers.BaseSerializer)]
+    errors = {}
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        errors['fields'] = f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(fields)}."
+    not_nested = [name for name in expand if name not in nested]
+    if not_nested:
+        errors['expand'] = f"Cannot expand: {', '.join(not_nested)}. Expandable: {', '.join(nested) or 'none'}."
+    if errors:
+        raise ValidationError(errors)
+
+    if not names:
+        return None
+    selected = set(names) | set(expand)
+    return [name for name in fields if name in selected]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer side of sparse fieldsets: drops the fields a read request did
+    not select. `field_sources` names the model fields read by fields that
+    are not model attributes, such as method fields.
+    """
+    field_sources = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = requested_fields(self.context.get('request'), fields)
+        if selected is None:
+            return fields
+        return {name: fields[name] for name in selected}
+
+    def projection(self):
+        """
+        (only, select_related) paths covering the selected fields, or None
+        when some field cannot be traced to a column and the full row must
+        be loaded.
+        """
+        return model_paths(self)
+
+
+def model_paths(serializer, prefix=''):
+    model = serializer.Meta.model
+    only, related = set(), []
+    for name, field in serializer.fields.items():
+        if name in getattr(serializer, 'field_sources', {}):
+            only.update(prefix + source for source in serializer.field_sources[name])
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            return None
+        if isinstance(field, serializers.BaseSerializer):
+            if not hasattr(field, 'Meta'):
+                return None
+            nested = model_paths(field, f'{prefix}{field.source}__')
+            if nested is None:
+                return None
+            # The foreign key itself has to be loaded to follow it.
+            only.add(prefix + field.source)
+            only |= nested[0]
+            related += [prefix + field.source, *nested[1]]
+            continue
+        only.add(prefix + field.source)
+    return only, related
+
+
+class SparseFieldsetMixin:
+    """
+    View side of sparse fieldsets: narrows the queryset to the columns
+    behind the selected serializer fields, plus the pagination ordering
+    the cursor is built from.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in READ_METHODS or 'fields' not in self.request.query_params:
+            return queryset
+        paths = self.get_serializer().projection()
+        if paths is None:
+            return queryset
+        only, related = paths
+        ordering = getattr(self.pagination_class, 'ordering', ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        only |= {field.lstrip('-') for field in ordering}
+
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only)
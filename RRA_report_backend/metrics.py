@@ -0,0 +1,220 @@
+"""
+Process metrics in the Prometheus text format, served at /metrics/.
+
+Counters and fixed-bucket histograms are kept in memory per process and
+updated under a lock. With several worker processes (gunicorn), each one
+also snapshots its values to its own JSON file in settings.METRICS_DIR at
+most every METRICS_FLUSH_SECONDS and when it exits. A scrape sums the
+files of every process, live or dead, so totals never go backwards when a
+worker is recycled; empty the directory when the service is redeployed.
+Values of other workers are therefore up to METRICS_FLUSH_SECONDS old.
+Without METRICS_DIR only the serving process is reported.
+
+Request metrics are recorded by the timing middleware, labelled with the
+URL name (e.g. report-list); exports and outgoing email record their own.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (2 ** 14, 2 ** 16, 2 ** 18, 2 ** 20, 2 ** 22, 2 ** 24, 2 ** 26, 2 ** 28, 2 ** 30)
+
+
+class Registry:
+    """
+    The metric definitions and this process's values. Counter values are
+    numbers; histogram values are [per-bucket counts..., +Inf count, sum].
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.pid = os.getpid()
+        self.file_name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.flushed_at = time.monotonic()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, labels, apply):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked (e.g. gunicorn --preload): start this worker's own series.
+                self.reset()
+            key = (metric.name, labels)
+            self.values[key] = apply(self.values.get(key))
+            due = time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, list(labels), list(value) if isinstance(value, list) else value]
+                    for (name, labels), value in self.values.items()]
+
+    def flush(self):
+        """Write this process's values to METRICS_DIR, atomically."""
+        directory = settings.METRICS_DIR
+        self.flushed_at = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Values of every process (just this one without METRICS_DIR), summed."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return {(name, tuple(labels)): value for name, labels, value in self.snapshot()}
+        self.flush()
+        totals = {}
+        for file_name in os.listdir(directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                key = (name, tuple(labels))
+                totals[key] = merge(totals.get(key), value)
+        return totals
+
+
+def merge(total, value):
+    if total is None:
+        return value
+    if isinstance(total, list):
+        if len(total) != len(value):
+            # bucket layout changed between deploys; keep the newer one
+            return value
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush())
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        registry.register(self)
+
+    def label_values(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.update(self, self.label_values(labels), lambda value: (value or 0) + amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, **labels):
+        index = bisect_left(self.buckets, amount)
+
+        def apply(value):
+            value = value or [0] * (len(self.buckets) + 2)
+            value[index] += 1
+            value[-1] += amount
+            return value
+
+        registry.update(self, self.label_values(labels), apply)
+
+
+REQUESTS = Counter('http_requests_total', 'Requests handled, by URL name, method and status.',
+                   ['view', 'method', 'status'])
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency until the response is returned.',
+                            ['view'])
+REQUEST_QUERIES = Histogram('http_request_queries', 'SQL queries run per request.', ['view'],
+                            buckets=QUERY_BUCKETS)
+EXPORT_SECONDS = Histogram('export_duration_seconds', 'Time to render an export file.', ['source', 'format'])
+EXPORT_BYTES = Histogram('export_size_bytes', 'Size of rendered export files.', ['source', 'format'],
+                         buckets=SIZE_BUCKETS)
+EMAIL_SECONDS = Histogram('email_send_duration_seconds', 'Time to hand one email to the mail server.')
+EMAILS = Counter('emails_total', 'Outbox delivery attempts, by result.', ['result'])
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """Every metric in the Prometheus text format (version 0.0.4)."""
+    values = registry.collect()
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        series = sorted((labels, value) for (name, labels), value in values.items() if name == metric.name)
+        for labels, value in series:
+            if metric.kind == 'counter':
+                lines.append(f'{metric.name}{label_text(metric.labels, labels)} {number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric.buckets, '+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else number(bound)
+                lines.append(f'{metric.name}_bucket{label_text(metric.labels, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{metric.name}_sum{label_text(metric.labels, labels)} {number(value[-1])}')
+            lines.append(f'{metric.name}_count{label_text(metric.labels, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    GET /metrics/ for the Prometheus scraper, which must send METRICS_TOKEN
+    as a bearer token. Without a token the metrics are only served with
+    DEBUG on, as they reveal the traffic of every endpoint.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
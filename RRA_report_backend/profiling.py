@@ -0,0 +1,170 @@
+"""
+On-demand profiling of single requests, for admins.
+
+An admin (is_staff) sends a request with the header `X-Profile: 1` or the
+query flag `?_profile=1` and a JWT bearer token. The request then runs
+under cProfile, or pyinstrument's sampling profiler when it is installed
+(settings.PROFILER). The profile is saved to settings.PROFILING_DIR and its
+id is returned in the X-Profile-Id response header. The directory is a
+ring buffer: only the newest PROFILING_MAX_FILES profiles are kept.
+
+    GET /profiles/           saved profiles, newest first (admins only)
+    GET /profiles/<id>/      download one: .prof for pstats/snakeviz,
+                             .html for pyinstrument
+
+Requests without the flag pay for one header and one query string lookup.
+Streaming responses are profiled up to their first byte.
+"""
+import cProfile
+import json
+import os
+import re
+import time
+import uuid
+from importlib.util import find_spec
+from time import perf_counter
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+PROFILE_ID = re.compile(r'^\d{20}-[0-9a-f]{8}$')
+
+
+def requested(request):
+    return request.headers.get('X-Profile') == '1' or request.GET.get('_profile') == '1'
+
+
+def profiling_user(request):
+    """The admin making `request`, from its bearer token, or None."""
+    from userApp.authentication import CachedJWTAuthentication
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    if authenticated is None or not authenticated[0].is_staff:
+        return None
+    return authenticated[0]
+
+
+def backend():
+    if settings.PROFILER == 'auto':
+        return 'pyinstrument' if find_spec('pyinstrument') else 'cprofile'
+    return settings.PROFILER
+
+
+def run_profiled(get_response, request):
+    """Run `request` under the profiler: (response, file extension, writer)."""
+    if backend() == 'pyinstrument':
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.stop()
+
+        def write(path):
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        return response, 'html', write
+
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    return response, 'prof', profiler.dump_stats
+
+
+def save_profile(extension, write, metadata):
+    """Store a profile and its metadata, then trim the ring buffer."""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    # Ids sort by creation time, which is what the ring buffer trims by.
+    profile_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(directory, f'{profile_id}.{extension}')
+    write(path)
+    metadata.update(id=profile_id, file=os.path.basename(path), size=os.path.getsize(path))
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(metadata, f)
+    trim(directory, settings.PROFILING_MAX_FILES)
+    return profile_id
+
+
+def trim(directory, keep):
+    ids = sorted({name.split('.')[0] for name in os.listdir(directory) if PROFILE_ID.match(name.split('.')[0])})
+    for profile_id in ids[:-keep] if keep else ids:
+        for name in os.listdir(directory):
+            if name.split('.')[0] == profile_id:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    # another worker trimmed it first
+                    pass
+
+
+def saved_profiles():
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json') and PROFILE_ID.match(name[:-5]):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+class ProfilingMiddleware:
+    """
+    Place right after the timing middleware, so the profile covers the
+    rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (settings.PROFILING_ENABLED and requested(request)):
+            return self.get_response(request)
+        user = profiling_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        start = perf_counter()
+        response, extension, write = run_profiled(self.get_response, request)
+        match = request.resolver_match
+        response.headers['X-Profile-Id'] = save_profile(extension, write, {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round((perf_counter() - start) * 1000, 1),
+            'user': user.username,
+        })
+        return response
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(saved_profiles())
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        for profile in saved_profiles():
+            if profile['id'] == profile_id:
+                path = os.path.join(settings.PROFILING_DIR, profile['file'])
+                if os.path.exists(path):
+                    return FileResponse(open(path, 'rb'), as_attachment=True, filename=profile['file'])
+        raise Http404
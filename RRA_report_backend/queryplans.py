@@ -0,0 +1,55 @@
+"""
+Query plan inspection used by the index tests: capture the SELECTs a
+request issues and ask the database how it would execute each of them.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Django writes `FROM "table" U0` / `JOIN "table" T3` for aliased tables.
+ALIAS_RE = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?\b')
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+@contextmanager
+def capture_selects(using=connection):
+    """Collect (sql, params) for every SELECT run inside the block."""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with using.execute_wrapper(record):
+        yield queries
+
+
+def explain(sql, params, using=connection):
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def plan_problems(sql, params, tables, allow_sort=False, using=connection):
+    """
+    Plan lines showing a full scan of one of `tables`, or (unless
+    `allow_sort`) a sort of a result set that no index delivers in order.
+    """
+    aliases = {alias: table for table, alias in ALIAS_RE.findall(sql)}
+    problems = []
+    for line in explain(sql, params, using):
+        if using.vendor == 'sqlite':
+            match = SQLITE_SCAN_RE.match(line.strip())
+            if 'TEMP B-TREE FOR ORDER BY' in line and not allow_sort:
+                problems.append(line.strip())
+        else:
+            match = POSTGRES_SCAN_RE.search(line)
+        if match and aliases.get(match.group(1), match.group(1)) in tables:
+            problems.append(line.strip())
+    return problems
@@ -0,0 +1,133 @@
+"""
+Versioned cache for dashboard and list responses.
+
+A cached response is keyed by its endpoint, its query string and the
+current version of every model it is computed from. Saving or deleting a
+Report or CustomUser bumps that model's version (see the signal receivers
+in reportApp.signals and userApp.signals; bulk writes call bump_version()
+themselves), so entries computed from older data are never read again and
+simply age out of the cache.
+
+Entries live in the 'responses' cache. The default local-memory backend is
+per process and evicts least recently used entries once it holds
+RESPONSE_CACHE_MAX_ENTRIES; point RESPONSE_CACHE_URL at a shared backend to
+share entries and versions between processes. TTLs per kind of endpoint
+come from RESPONSE_CACHE_TTLS and bound staleness when a change is missed.
+
+Concurrent misses for the same key within a process are single-flighted:
+one request computes the response, the others wait for it and read it
+from the cache.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+_MISSING = object()
+
+
+def response_cache():
+    return caches['responses']
+
+
+def version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def model_versions(models):
+    cache = response_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1 so a counter that was
+            # evicted never comes back at a number it already had.
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(model):
+    cache = response_cache()
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.add(version_key(model), time.time_ns())
+
+
+def bump_version(model):
+    """
+    Invalidate every cached response computed from `model`. Bumped again
+    once the transaction commits, so a response cached from another
+    connection in between (which cannot see the change yet) is dropped too.
+    """
+    _bump(model)
+    transaction.on_commit(lambda: _bump(model))
+
+
+def response_key(namespace, models, request):
+    versions = '.'.join(str(version) for version in model_versions(models))
+    # The URL matters beyond the query string: pagination links are absolute.
+    digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f'response:{namespace}:{versions}:{digest}'
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(key, compute):
+    """
+    compute() once per key at a time within this process. Callers arriving
+    while it runs wait for it and then read its result from the cache,
+    computing it themselves only if it was not cached.
+    """
+    with _flights_lock:
+        done = _flights.get(key)
+        leader = done is None
+        if leader:
+            done = _flights[key] = threading.Event()
+    if not leader:
+        done.wait(settings.RESPONSE_CACHE_WAIT_SECONDS)
+        cached = response_cache().get(key, _MISSING)
+        return cached if cached is not _MISSING else compute()
+    try:
+        return compute()
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        done.set()
+
+
+def cached_get(models, ttl='default'):
+    """
+    Decorate a view's get() to serve its successful responses from the
+    response cache. `models` are the models the response is computed from
+    and `ttl` names its entry in RESPONSE_CACHE_TTLS. Authentication and
+    permission checks still run on every request, before the cache is read.
+    """
+    def decorator(get):
+        @wraps(get)
+        def cached(view, request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED:
+                return get(view, request, *args, **kwargs)
+            key = response_key(type(view).__name__, models, request)
+            data = response_cache().get(key, _MISSING)
+            if data is not _MISSING:
+                return Response(data)
+
+            def compute():
+                response = get(view, request, *args, **kwargs)
+                if response.status_code == 200:
+                    response_cache().set(key, response.data, settings.RESPONSE_CACHE_TTLS[ttl])
+                return response
+
+            result = single_flight(key, compute)
+            return result if isinstance(result, Response) else Response(result)
+        return cached
+    return decorator
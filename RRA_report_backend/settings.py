@@ -26,9 +26,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'userApp',
     'reportApp',
+    'exportApp',
 ]
 
 MIDDLEWARE = [
+    'RRA_report_backend.timing.ServerTimingMiddleware',
+    'RRA_report_backend.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,17 +114,109 @@ EMAIL_HOST_USER = 'seraphineiraguha40@gmail.com'
 EMAIL_HOST_PASSWORD = 'dcsf rcof mllm npza'
 DEFAULT_FROM_EMAIL = 'no-reply'
 
+# Email outbox (userApp.outbox). Messages are sent in batches of BATCH_SIZE
+# per connection; a failure is retried after BACKOFF_SECONDS, doubling per
+# attempt, up to MAX_ATTEMPTS. With EMAIL_OUTBOX_THREAD off, run
+# `manage.py send_outbox --loop` instead.
+EMAIL_OUTBOX_THREAD = env.bool('EMAIL_OUTBOX_THREAD', default=True)
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6)
+EMAIL_OUTBOX_BACKOFF_SECONDS = env.int('EMAIL_OUTBOX_BACKOFF_SECONDS', default=30)
+EMAIL_OUTBOX_POLL_SECONDS = env.int('EMAIL_OUTBOX_POLL_SECONDS', default=30)
+EMAIL_OUTBOX_CLAIM_TIMEOUT = env.int('EMAIL_OUTBOX_CLAIM_TIMEOUT', default=600)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'userApp.authentication.CachedJWTAuthentication',
     ),
 }
 
+# Page size for the cursor-paginated report and user list endpoints.
+# Clients can ask for a different size with ?page_size= (capped at 500).
+PAGINATION_PAGE_SIZE = env.int('PAGINATION_PAGE_SIZE', default=50)
+
+# Serve report and user list pages from values() rows instead of model
+# instances (RRA_report_backend/fastread.py). The JSON is identical either way.
+FAST_READS = env.bool('FAST_READS', default=True)
+
+# In-process cache of username/email/phone -> user id used by the report
+# by_user lookup.
+USER_LOOKUP_CACHE_SIZE = env.int('USER_LOOKUP_CACHE_SIZE', default=1024)
+USER_LOOKUP_CACHE_TTL = env.int('USER_LOOKUP_CACHE_TTL', default=300)
+
+# Where authenticated user records are cached: 'local' for a per-process
+# LRU of USER_AUTH_CACHE_SIZE entries, or the name of an entry in CACHES.
+USER_AUTH_CACHE = env.str('USER_AUTH_CACHE', default='local')
+USER_AUTH_CACHE_SIZE = env.int('USER_AUTH_CACHE_SIZE', default=4096)
+USER_AUTH_CACHE_TTL = env.int('USER_AUTH_CACHE_TTL', default=60)
+
+# Response cache (RRA_report_backend.responsecache) for the count, trend
+# and list endpoints. The local-memory default is per process and drops the
+# least recently used tenth of its entries once it holds MAX_ENTRIES; set
+# RESPONSE_CACHE_URL (e.g. redis://...) to share it between processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': env.cache_url('RESPONSE_CACHE_URL', default='locmemcache://responses'),
+}
+if CACHES['responses']['BACKEND'].endswith('LocMemCache'):
+    CACHES['responses']['OPTIONS'] = {
+        'MAX_ENTRIES': env.int('RESPONSE_CACHE_MAX_ENTRIES', default=2000),
+        'CULL_FREQUENCY': 10,
+    }
+RESPONSE_CACHE_ENABLED = env.bool('RESPONSE_CACHE_ENABLED', default=True)
+RESPONSE_CACHE_TTLS = {
+    'default': env.int('RESPONSE_CACHE_TTL', default=60),
+    'count': env.int('RESPONSE_CACHE_TTL_COUNT', default=60),
+    'trend': env.int('RESPONSE_CACHE_TTL_TREND', default=300),
+    'list': env.int('RESPONSE_CACHE_TTL_LIST', default=30),
+}
+# Longest a request waits for a concurrent identical request to fill the cache.
+RESPONSE_CACHE_WAIT_SECONDS = env.float('RESPONSE_CACHE_WAIT_SECONDS', default=10)
+
+# Most report ids one batch approve/update request may list.
+REPORT_BATCH_MAX_IDS = env.int('REPORT_BATCH_MAX_IDS', default=5000)
+
+# Deepest level below a user that subtree queries follow created_by to.
+USER_HIERARCHY_MAX_DEPTH = env.int('USER_HIERARCHY_MAX_DEPTH', default=20)
+
+# Bulk user import (userApp.imports). Passwords are hashed on a pool of
+# HASH_WORKERS processes once a file has at least PARALLEL_MIN valid rows.
+USER_IMPORT_MAX_ROWS = env.int('USER_IMPORT_MAX_ROWS', default=10000)
+USER_IMPORT_BATCH_SIZE = env.int('USER_IMPORT_BATCH_SIZE', default=500)
+USER_IMPORT_HASH_WORKERS = env.int('USER_IMPORT_HASH_WORKERS', default=4)
+USER_IMPORT_PARALLEL_MIN = env.int('USER_IMPORT_PARALLEL_MIN', default=16)
+
+# Export jobs (exportApp): rendered files are kept on local disk and
+# evicted by age and by total size.
+EXPORT_ROOT = env('EXPORT_ROOT', default=str(BASE_DIR / 'exports'))
+EXPORT_WORKERS = env.int('EXPORT_WORKERS', default=2)
+EXPORT_JOB_REUSE_SECONDS = env.int('EXPORT_JOB_REUSE_SECONDS', default=300)
+# Jobs queued or running for longer than this are presumed lost to a crash
+# or restart: they are no longer reused, and run_export_jobs requeues them.
+EXPORT_JOB_TIMEOUT = env.int('EXPORT_JOB_TIMEOUT', default=15 * 60)
+EXPORT_ARTIFACT_MAX_AGE = env.int('EXPORT_ARTIFACT_MAX_AGE', default=24 * 3600)
+EXPORT_ARTIFACT_MAX_BYTES = env.int('EXPORT_ARTIFACT_MAX_BYTES', default=1024 ** 3)
+# Render jobs inside the request instead of on the pool (used by tests).
+EXPORT_JOBS_EAGER = env.bool('EXPORT_JOBS_EAGER', default=False)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_REFRESH_SERIALIZER': 'userApp.serializers.RevocationAwareTokenRefreshSerializer',
 }
 
+# In-memory refresh-token revocation set (userApp.revocation). Blacklist
+# rows written by other processes are picked up within SYNC_SECONDS.
+TOKEN_REVOCATION_CAPACITY = env.int('TOKEN_REVOCATION_CAPACITY', default=100000)
+TOKEN_REVOCATION_ERROR_RATE = env.float('TOKEN_REVOCATION_ERROR_RATE', default=0.001)
+TOKEN_REVOCATION_SYNC_SECONDS = env.float('TOKEN_REVOCATION_SYNC_SECONDS', default=5)
+TOKEN_REVOCATION_REBUILD_SECONDS = env.float('TOKEN_REVOCATION_REBUILD_SECONDS', default=3600)
+# How far back each sync re-reads blacklist rows, to catch ones that
+# committed after a row with a higher pk.
+TOKEN_REVOCATION_SYNC_MARGIN_SECONDS = env.float('TOKEN_REVOCATION_SYNC_MARGIN_SECONDS', default=60)
+
 # CORS_ALLOWED_ORIGINS = [
 #     'http://localhost:3000',
 #     'http://localhost:5000',
@@ -134,6 +229,33 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 AUTH_USER_MODEL = 'userApp.CustomUser'
 
+# Per-request timing (RRA_report_backend/timing.py): Server-Timing headers
+# and a log line for requests slower than SLOW_REQUEST_MS or running at
+# least SLOW_REQUEST_QUERIES queries.
+SERVER_TIMING_ENABLED = env.bool('SERVER_TIMING_ENABLED', default=True)
+SERVER_TIMING_HEADER = env.bool('SERVER_TIMING_HEADER', default=True)
+SLOW_REQUEST_MS = env.int('SLOW_REQUEST_MS', default=1000)
+SLOW_REQUEST_QUERIES = env.int('SLOW_REQUEST_QUERIES', default=50)
+
+# Prometheus metrics at /metrics/ (RRA_report_backend/metrics.py). Under
+# several worker processes point METRICS_DIR at a directory they share,
+# emptied on each deploy; each worker writes its values there at most every
+# METRICS_FLUSH_SECONDS. Scrapers must send METRICS_TOKEN as a bearer
+# token; while it is empty /metrics/ answers 403 unless DEBUG is on.
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_DIR = env('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = env.int('METRICS_FLUSH_SECONDS', default=5)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Admin-only request profiling (RRA_report_backend/profiling.py), triggered
+# by `X-Profile: 1` or `?_profile=1`. PROFILER is 'cprofile', 'pyinstrument'
+# or 'auto' (pyinstrument when installed). Only the newest
+# PROFILING_MAX_FILES profiles are kept in PROFILING_DIR.
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=True)
+PROFILER = env('PROFILER', default='auto')
+PROFILING_DIR = env('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = env.int('PROFILING_MAX_FILES', default=50)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -0,0 +1,135 @@
+"""
+Count aggregations shared by the report and user dashboard endpoints.
+
+The endpoints read the daily rollup tables (ReportDailyStat, UserDailyStat)
+through the rollup_* helpers, so their cost depends on the number of days
+covered rather than on table size. window_counts and bucket_counts compute
+the same figures from the raw tables.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Trunc, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def window_counts(queryset, field, windows, now=None):
+    """
+    Count the rows whose `field` falls in each trailing window, e.g.
+    {'daily': timedelta(days=1)}, with one conditional aggregate query.
+    """
+    now = now or timezone.now()
+    return queryset.aggregate(**{
+        name: Count('pk', filter=Q(**{f'{field}__range': (now - interval, now)}))
+        for name, interval in windows.items()
+    })
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a ?from= / ?to= value. A bare date covers the whole day, so
+    ?to=2024-01-31 includes everything on the 31st.
+    """
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ValueError(f"Invalid date: {value!r}, expected YYYY-MM-DD or an ISO 8601 datetime.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_series_params(params):
+    bucket = params.get('bucket')
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}.")
+    start = parse_bound(params['from']) if params.get('from') else None
+    end = parse_bound(params['to'], end=True) if params.get('to') else None
+    if start and end and start >= end:
+        raise ValueError("'from' must be before 'to'.")
+    return bucket, start, end
+
+
+def bucket_counts(queryset, field, bucket, start=None, end=None):
+    """
+    Histogram of rows per day, week or month of `field`, from one GROUP BY
+    on the truncated date. Buckets with no rows are omitted.
+    """
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    rows = (queryset.annotate(bucket=BUCKETS[bucket](field))
+            .values('bucket')
+            .annotate(count=Count('pk'))
+            .order_by('bucket'))
+    return [{'date': row['bucket'].date().isoformat(), 'count': row['count']} for row in rows]
+
+
+def rollup_window_counts(queryset, windows, today=None):
+    """
+    window_counts read from a daily rollup table. Windows are whole days: a
+    window of N days covers today and the N-1 days before it.
+    """
+    today = today or timezone.localdate()
+    totals = queryset.aggregate(**{
+        name: Sum('count', filter=Q(date__gt=today - interval))
+        for name, interval in windows.items()
+    })
+    return {name: total or 0 for name, total in totals.items()}
+
+
+def rollup_bucket_counts(queryset, bucket, start=None, end=None):
+    """
+    bucket_counts read from a daily rollup table, at day granularity: the
+    days holding `start` and `end` are counted whole, unless `end` is
+    midnight, which excludes its day.
+    """
+    if start:
+        queryset = queryset.filter(date__gte=timezone.localdate(start))
+    if end:
+        local_end = timezone.localtime(end)
+        if local_end.time() == time.min:
+            queryset = queryset.filter(date__lt=local_end.date())
+        else:
+            queryset = queryset.filter(date__lte=local_end.date())
+    if bucket == 'day':
+        expression = F('date')
+    else:
+        expression = Trunc('date', bucket, output_field=DateField())
+    rows = (queryset.annotate(bucket=expression)
+            .values('bucket')
+            .annotate(total=Sum('count'))
+            .filter(total__gt=0)
+            .order_by('bucket'))
+    return [{'date': row['bucket'].isoformat(), 'count': row['total']} for row in rows]
+
+
+def rollup_total(queryset):
+    return queryset.aggregate(total=Sum('count'))['total'] or 0
+
+
+def series(params, counts):
+    """
+    Response body for ?bucket=day|week|month&from=&to=, where
+    counts(bucket, start, end) returns the histogram rows.
+    """
+    bucket, start, end = parse_series_params(params)
+    return {
+        'bucket': bucket,
+        'from': start,
+        'to': end,
+        'series': counts(bucket, start, end),
+    }
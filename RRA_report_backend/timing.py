@@ -0,0 +1,130 @@
+"""
+Per-request timing: Server-Timing headers and a slow-request log.
+
+For every request the middleware records the total time, the number of SQL
+queries and the time spent in them (through connection.execute_wrapper),
+the time in the view (including serialization) and the time rendering the
+response. They are sent back as
+
+    Server-Timing: total;dur=12.1;desc="report-list", db;dur=3.2;desc="3 queries",
+                   view;dur=7.9, render;dur=2.4
+
+and requests over SLOW_REQUEST_MS or SLOW_REQUEST_QUERIES are logged as
+one JSON object on the RRA_report_backend.timing logger. The same numbers
+feed the request metrics in RRA_report_backend/metrics.py. Streaming
+responses (the exports) are timed up to their first byte.
+
+The bookkeeping is a few perf_counter() calls per request and per query,
+cheap enough to leave on in production; SERVER_TIMING_HEADER controls
+whether the numbers are exposed to clients.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics as request_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTiming:
+    """Timestamps of one request, and an execute wrapper summing its SQL."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.view_start = self.view_end = None
+        self.render_start = self.render_end = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += perf_counter() - start
+
+    def rendered(self, response):
+        self.render_end = perf_counter()
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class ServerTimingMiddleware:
+    """
+    Goes first in MIDDLEWARE so that `total` covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        request.timing = timing
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            response = self.get_response(request)
+        end = perf_counter()
+
+        match = request.resolver_match
+        metrics = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': ms(end - timing.start),
+            'db_ms': ms(timing.sql),
+            'queries': timing.queries,
+        }
+        if timing.view_start is not None:
+            metrics['view_ms'] = ms((timing.view_end or end) - timing.view_start)
+        if timing.render_end is not None:
+            metrics['render_ms'] = ms(timing.render_end - timing.render_start)
+
+        if settings.METRICS_ENABLED:
+            record(metrics, end - timing.start)
+        if settings.SERVER_TIMING_HEADER:
+            response.headers['Server-Timing'] = server_timing(metrics)
+        if (metrics['total_ms'] >= settings.SLOW_REQUEST_MS
+                or metrics['queries'] >= settings.SLOW_REQUEST_QUERIES):
+            logger.warning('slow request %s', json.dumps(metrics), extra={'request_timing': metrics})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timing.view_start = perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called once the view has returned and right before the response
+        # (a DRF Response included) is rendered.
+        timing = request.timing
+        timing.view_end = timing.render_start = perf_counter()
+        response.add_post_render_callback(timing.rendered)
+        return response
+
+
+def record(metrics, seconds):
+    view = metrics['view'] or 'unmatched'
+    request_metrics.REQUESTS.inc(view=view, method=metrics['method'], status=metrics['status'])
+    request_metrics.REQUEST_SECONDS.observe(seconds, view=view)
+    request_metrics.REQUEST_QUERIES.observe(metrics['queries'], view=view)
+
+
+def server_timing(metrics):
+    entries = [f'total;dur={metrics["total_ms"]}' + (f';desc="{metrics["view"]}"' if metrics['view'] else ''),
+               f'db;dur={metrics["db_ms"]};desc="{metrics["queries"]} queries"']
+    if 'view_ms' in metrics:
+        entries.append(f'view;dur={metrics["view_ms"]}')
+    if 'render_ms' in metrics:
+        entries.append(f'render;dur={metrics["render_ms"]}')
+    return ', '.join(entries)
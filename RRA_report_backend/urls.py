@@ -2,6 +2,8 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from RRA_report_backend.metrics import metrics_view
+from RRA_report_backend.profiling import ProfileDownloadView, ProfileListView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -13,4 +15,8 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('report/', include('reportApp.urls')),
+    path('export/', include('exportApp.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:profile_id>/', ProfileDownloadView.as_view(), name='profile-download'),
 ]
@@ -0,0 +1,14 @@
+# export/datasets.py
+from reportApp.exports import report_dataset
+from reportApp.models import Report
+from userApp.exports import user_dataset
+
+
+def dataset_for(job):
+    if job.dataset == 'reports':
+        return report_dataset()
+    if job.dataset == 'report':
+        return report_dataset(Report.objects.filter(pk=job.object_id), title="Report")
+    if job.dataset == 'users':
+        return user_dataset()
+    raise ValueError(f'Unknown export dataset: {job.dataset}')
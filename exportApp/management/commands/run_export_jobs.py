@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exportApp.models import ExportJob
+from exportApp.worker import evict_artifacts, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = ('Render pending export jobs (e.g. left over from a restart), requeue jobs stuck running '
+            'past EXPORT_JOB_TIMEOUT and evict old export files.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale_jobs()
+            job_ids = list(ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True))
+            for job_id in job_ids:
+                run_job(job_id)
+            evicted = evict_artifacts()
+            if job_ids or evicted or requeued:
+                self.stdout.write(f'Requeued {requeued} stale job(s), rendered {len(job_ids)} job(s), '
+                                  f'evicted {evicted} file(s).')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
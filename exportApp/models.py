@@ -0,0 +1,47 @@
+from django.db import models
+from userApp.models import CustomUser
+
+
+class ExportJob(models.Model):
+    DATASET_CHOICES = (
+        ('reports', 'All Reports'),
+        ('report', 'Single Report'),
+        ('users', 'Users'),
+    )
+    FORMAT_CHOICES = (
+        ('pdf', 'PDF'),
+        ('xlsx', 'Excel'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    )
+
+    dataset = models.CharField(max_length=20, choices=DATASET_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    object_id = models.BigIntegerField(null=True, blank=True)  # report id for the 'report' dataset
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file_name = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'format', 'object_id', 'status'], name='exportjob_dedup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.dataset}.{self.format} ({self.status})'
+
+    @property
+    def download_name(self):
+        if self.dataset == 'report':
+            return f'report_{self.object_id}.{self.format}'
+        return f'{"all_reports" if self.dataset == "reports" else "users"}.{self.format}'
@@ -0,0 +1,196 @@
+# export/renderers.py
+"""
+File renderers shared by the report and user download views.
+
+A renderer takes an ExportDataset and writes it to a file object without
+materialising the rows: `rows` is consumed once, front to back, so the
+caller can feed it straight from QuerySet.iterator().
+"""
+import tempfile
+import time
+from collections import namedtuple
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+
+from RRA_report_backend.metrics import EXPORT_BYTES, EXPORT_SECONDS
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_CONTENT_TYPE = 'application/pdf'
+
+# Rows laid out per reportlab Table. Layout cost is superlinear in the size
+# of a single table, so the document is built from many small tables.
+PDF_CHUNK_ROWS = 100
+PDF_FONT_SIZE = 7
+PDF_HEADER_HEIGHT = 0.3 * inch
+
+# Excel refuses column widths above 255 characters.
+MAX_COLUMN_WIDTH = 255
+
+# `max_lengths` holds the longest value (in characters) of each column,
+# usually computed with one aggregate query, so widths are known before the
+# first row is written.
+ExportDataset = namedtuple('ExportDataset', ['title', 'headers', 'rows', 'max_lengths'])
+
+
+def column_widths(dataset):
+    widths = []
+    for header, length in zip(dataset.headers, dataset.max_lengths):
+        widths.append(min((max(len(header), length or 0) + 2) * 1.2, MAX_COLUMN_WIDTH))
+    return widths
+
+
+def write_xlsx(fileobj, dataset):
+    # A write-only workbook flushes each row to disk as it is appended, so
+    # memory stays flat no matter how many rows the dataset yields.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(dataset.title)
+    for index, width in enumerate(column_widths(dataset), start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    header = []
+    for value in dataset.headers:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        header.append(cell)
+    ws.append(header)
+
+    for row in dataset.rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+PDF_CELL_STYLE = ParagraphStyle('cell', fontName='Helvetica', fontSize=PDF_FONT_SIZE, leading=PDF_FONT_SIZE + 2)
+
+PDF_HEADER_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), PDF_FONT_SIZE + 1),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+PDF_BODY_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), PDF_FONT_SIZE),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def pdf_column_widths(dataset, total_width):
+    # Share the page width out by column length, but stop very long columns
+    # (descriptions) from squeezing the others; their text wraps instead.
+    weights = [min(max(len(header), length or 0), 40) + 2
+               for header, length in zip(dataset.headers, dataset.max_lengths)]
+    return [total_width * weight / sum(weights) for weight in weights]
+
+
+class _ChunkedFlowables(list):
+    """
+    The flowable list handed to reportlab's build loop. It only ever holds
+    the table being laid out (plus any split remainder) and pulls the next
+    chunk when the build loop asks whether it is empty.
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+
+    def __len__(self):
+        if not super().__len__():
+            chunk = next(self._chunks, None)
+            if chunk is not None:
+                self.append(chunk)
+        return super().__len__()
+
+
+def write_pdf(fileobj, dataset, chunk_size=PDF_CHUNK_ROWS):
+    doc = SimpleDocTemplate(
+        fileobj,
+        pagesize=landscape(letter),
+        title=dataset.title,
+        leftMargin=0.4 * inch,
+        rightMargin=0.4 * inch,
+        topMargin=0.5 * inch + PDF_HEADER_HEIGHT,
+        bottomMargin=0.5 * inch,
+        pageCompression=1,
+    )
+    widths = pdf_column_widths(dataset, doc.width)
+    # Roughly how many characters fit on one line of each column.
+    fits = [int(width / (PDF_FONT_SIZE * 0.5)) for width in widths]
+
+    header = Table([dataset.headers], colWidths=widths, rowHeights=[PDF_HEADER_HEIGHT])
+    header.setStyle(PDF_HEADER_STYLE)
+
+    def draw_header(canvas, doc):
+        # The column header is drawn by the page template, so every page
+        # gets one and the row tables below it can follow on seamlessly.
+        header.wrapOn(canvas, doc.width, PDF_HEADER_HEIGHT)
+        header.drawOn(canvas, doc.leftMargin, doc.pagesize[1] - doc.topMargin)
+
+    def cell(value, column):
+        text = '' if value is None else str(value)
+        if len(text) <= fits[column]:
+            return text
+        return Paragraph(escape(text).replace('\n', '<br/>'), PDF_CELL_STYLE)
+
+    def tables():
+        rows = iter(dataset.rows)
+        while True:
+            chunk = [[cell(value, column) for column, value in enumerate(row)]
+                     for row in islice(rows, chunk_size)]
+            if not chunk:
+                return
+            # splitInRow lets a row taller than a page (a long description)
+            # continue on the next page instead of failing the build.
+            table = Table(chunk, colWidths=widths, splitInRow=1)
+            table.setStyle(PDF_BODY_STYLE)
+            yield table
+
+    doc.build(_ChunkedFlowables(tables()), onFirstPage=draw_header, onLaterPages=draw_header)
+
+
+def record_export(source, render, seconds, size):
+    format = 'pdf' if render is write_pdf else 'xlsx'
+    EXPORT_SECONDS.observe(seconds, source=source, format=format)
+    EXPORT_BYTES.observe(size, source=source, format=format)
+
+
+def file_response(render, dataset, filename, content_type):
+    """
+    Render `dataset` into a temporary file and stream it back in blocks.
+    The file is removed once the response is closed.
+    """
+    tmp = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    try:
+        render(tmp, dataset)
+    except Exception:
+        tmp.close()
+        raise
+    record_export('download', render, time.perf_counter() - start, tmp.tell())
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=content_type)
+
+
+def xlsx_response(dataset, filename, content_type=XLSX_CONTENT_TYPE):
+    return file_response(write_xlsx, dataset, filename, content_type)
+
+
+def pdf_response(dataset, filename):
+    return file_response(write_pdf, dataset, filename, PDF_CONTENT_TYPE)
@@ -0,0 +1,35 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from reportApp.models import Report
+from .models import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'dataset', 'format', 'object_id', 'status', 'size', 'error',
+                  'created_at', 'finished_at', 'status_url', 'download_url']
+        read_only_fields = ['id', 'status', 'size', 'error', 'created_at', 'finished_at']
+
+    def validate(self, attrs):
+        if attrs['dataset'] == 'report':
+            object_id = attrs.get('object_id')
+            if object_id is None:
+                raise serializers.ValidationError({"object_id": "Required for the 'report' dataset."})
+            if not Report.objects.filter(pk=object_id).exists():
+                raise serializers.ValidationError({"object_id": "Report not found."})
+        else:
+            attrs['object_id'] = None
+        return attrs
+
+    def get_status_url(self, obj):
+        return reverse('export-job-detail', args=[obj.pk])
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        return reverse('export-job-download', args=[obj.pk])
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reportApp.models import Report
+from reportApp.seed import seed_reports, seed_users
+from .models import ExportJob
+from .worker import _expire, evict_artifacts, find_reusable_job
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(20, [cls.admin])
+
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.export_root = export_root.name
+        settings_override = override_settings(EXPORT_ROOT=export_root.name, EXPORT_JOBS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def create_job(self, **data):
+        return self.client.post(reverse('export-job-create'), data, format='json')
+
+    def test_job_renders_and_downloads(self):
+        response = self.create_job(dataset='reports', format='xlsx')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'done')
+
+        status_response = self.client.get(response.data['status_url'])
+        self.assertEqual(status_response.data['download_url'], reverse('export-job-download', args=[response.data['id']]))
+
+        download = self.client.get(response.data['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('all_reports.xlsx', download['Content-Disposition'])
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'PK'))
+
+        cached = self.client.get(response.data['download_url'], HTTP_IF_NONE_MATCH=download['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_single_report_needs_an_existing_report(self):
+        self.assertEqual(self.create_job(dataset='report', format='pdf').status_code, 400)
+        self.assertEqual(self.create_job(dataset='report', format='pdf', object_id=0).status_code, 400)
+        report = Report.objects.first()
+        response = self.create_job(dataset='report', format='pdf', object_id=report.pk)
+        self.assertEqual(response.data['status'], 'done')
+
+    def test_identical_jobs_are_deduplicated(self):
+        first = self.create_job(dataset='users', format='pdf')
+        second = self.create_job(dataset='users', format='pdf')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertNotEqual(self.create_job(dataset='users', format='xlsx').data['id'], first.data['id'])
+
+    def test_eviction_by_age_and_total_size(self):
+        old = ExportJob.objects.get(pk=self.create_job(dataset='reports', format='pdf').data['id'])
+        new = ExportJob.objects.get(pk=self.create_job(dataset='users', format='pdf').data['id'])
+        ExportJob.objects.filter(pk=old.pk).update(finished_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(evict_artifacts(max_age=24 * 3600, max_bytes=10 ** 9), 1)
+        old.refresh_from_db()
+        self.assertEqual(old.status, 'expired')
+        self.assertEqual(self.client.get(reverse('export-job-download', args=[old.pk])).status_code, 410)
+
+        self.assertEqual(evict_artifacts(max_age=24 * 3600, max_bytes=new.size - 1), 1)
+        new.refresh_from_db()
+        self.assertEqual(new.status, 'expired')
+        self.assertEqual(os.listdir(self.export_root), [])
+
+    def test_concurrent_eviction(self):
+        job = ExportJob.objects.get(pk=self.create_job(dataset='users', format='pdf').data['id'])
+        stale = ExportJob.objects.get(pk=job.pk)
+        os.remove(os.path.join(self.export_root, job.file_name))
+        self.assertTrue(_expire(job))
+        # A second evictor holding the same row neither fails nor counts it.
+        self.assertFalse(_expire(stale))
+
+    def test_job_stuck_running_is_requeued(self):
+        job = ExportJob.objects.create(dataset='users', format='pdf', status='running',
+                                       started_at=timezone.now() - timedelta(hours=1))
+        # A worker that died mid-render must not capture every later request.
+        self.assertIsNone(find_reusable_job('users', 'pdf'))
+        fresh = self.create_job(dataset='users', format='pdf')
+        self.assertEqual(fresh.status_code, 202)
+        self.assertNotEqual(fresh.data['id'], job.pk)
+
+        out = StringIO()
+        with self.assertLogs('exportApp.worker', 'WARNING'):
+            call_command('run_export_jobs', stdout=out)
+        self.assertIn('Requeued 1 stale job(s)', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    def test_recent_running_job_is_left_alone(self):
+        job = ExportJob.objects.create(dataset='users', format='pdf', status='running', started_at=timezone.now())
+        self.assertEqual(find_reusable_job('users', 'pdf'), job)
+        call_command('run_export_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+
+class ExportJobPoolTests(TransactionTestCase):
+    """Jobs handed to the thread pool once the request's transaction commits."""
+
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings_override = override_settings(EXPORT_ROOT=export_root.name, EXPORT_JOBS_EAGER=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(seed_users(1, role='admin')[0])
+
+    def test_job_renders_on_the_pool(self):
+        response = self.client.post(reverse('export-job-create'), {'dataset': 'users', 'format': 'xlsx'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(response.data['status'], ['pending', 'running', 'done'])
+
+        job = ExportJob.objects.get(pk=response.data['id'])
+        deadline = time.monotonic() + 10
+        while job.status in ('pending', 'running') and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        download = self.client.get(reverse('export-job-download', args=[job.pk]))
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'PK'))
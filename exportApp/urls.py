@@ -0,0 +1,9 @@
+# export/urls.py
+from django.urls import path
+from .views import ExportJobCreateView, ExportJobDetailView, ExportJobDownloadView
+
+urlpatterns = [
+    path('jobs/', ExportJobCreateView.as_view(), name='export-job-create'),
+    path('jobs/<int:pk>/', ExportJobDetailView.as_view(), name='export-job-detail'),
+    path('jobs/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export-job-download'),
+]
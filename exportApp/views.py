@@ -0,0 +1,75 @@
+# export/views.py
+"""
+Asynchronous export jobs: enqueue a PDF or Excel export, poll its status,
+then download the finished file.
+"""
+import os
+
+from django.http import FileResponse
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from RRA_report_backend.conditional import conditional_get, make_etag
+from .models import ExportJob
+from .renderers import PDF_CONTENT_TYPE, XLSX_CONTENT_TYPE
+from .serializers import ExportJobSerializer
+from .worker import artifact_path, find_reusable_job, submit
+
+CONTENT_TYPES = {
+    'pdf': PDF_CONTENT_TYPE,
+    'xlsx': XLSX_CONTENT_TYPE,
+}
+
+
+class ExportJobCreateView(generics.CreateAPIView):
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        # Identical exports share one job and one file.
+        job = find_reusable_job(data['dataset'], data['format'], data['object_id'])
+        if job is not None:
+            return Response(self.get_serializer(job).data, status=status.HTTP_200_OK)
+
+        job = serializer.save(created_by=request.user)
+        submit(job)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailView(generics.RetrieveAPIView):
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+
+def artifact_state(view, request, *args, **kwargs):
+    # A finished artifact never changes, so the job identifies it.
+    job = ExportJob.objects.filter(pk=kwargs['pk'], status='done').values_list('file_name', 'finished_at').first()
+    if job is None:
+        return None
+    return make_etag('export', kwargs['pk'], *job), job[1]
+
+
+class ExportJobDownloadView(generics.GenericAPIView):
+    queryset = ExportJob.objects.all()
+    permission_classes = [IsAuthenticated]
+
+    @conditional_get(artifact_state)
+    def get(self, request, pk):
+        job = self.get_object()
+        if job.status == 'expired':
+            return Response({"error": "Export file has expired, request a new export"}, status=status.HTTP_410_GONE)
+        if job.status != 'done':
+            return Response({"error": f"Export is {job.status}"}, status=status.HTTP_409_CONFLICT)
+
+        path = artifact_path(job.file_name)
+        if not os.path.exists(path):
+            return Response({"error": "Export file has expired, request a new export"}, status=status.HTTP_410_GONE)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.download_name,
+                            content_type=CONTENT_TYPES[job.format])
@@ -0,0 +1,167 @@
+# export/worker.py
+"""
+Local worker pool for export jobs.
+
+Jobs are rendered on a small thread pool inside the web process, so a
+download request returns as soon as the job row is written. Finished files
+live under settings.EXPORT_ROOT; `manage.py run_export_jobs` drains jobs
+left pending by a restart, requeues jobs stuck running past
+EXPORT_JOB_TIMEOUT and applies the same eviction rules.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .datasets import dataset_for
+from .models import ExportJob
+from .renderers import record_export, write_pdf, write_xlsx
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {
+    'pdf': write_pdf,
+    'xlsx': write_xlsx,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix='export')
+        return _executor
+
+
+def find_reusable_job(dataset, format, object_id=None):
+    """
+    An identical job that is still queued or running (within
+    EXPORT_JOB_TIMEOUT), or finished recently enough to serve as is.
+    """
+    now = timezone.now()
+    fresh_since = now - timedelta(seconds=settings.EXPORT_JOB_REUSE_SECONDS)
+    alive_since = now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    jobs = ExportJob.objects.filter(dataset=dataset, format=format, object_id=object_id)
+    return (
+        (jobs.filter(status='pending', created_at__gte=alive_since)
+         | jobs.filter(status='running', started_at__gte=alive_since)).order_by('-created_at').first()
+        or jobs.filter(status='done', finished_at__gte=fresh_since).order_by('-finished_at').first()
+    )
+
+
+def submit(job):
+    if settings.EXPORT_JOBS_EAGER:
+        run_job(job.pk)
+    else:
+        # Hand the job to the pool only once its row is visible to other
+        # connections.
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def artifact_path(file_name):
+    return os.path.join(settings.EXPORT_ROOT, file_name)
+
+
+def run_job(job_id):
+    # Claim the job atomically so a job is never rendered twice by the pool
+    # and the management command at the same time.
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(status='running', started_at=timezone.now())
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    file_name = f'{job.pk}.{job.format}'
+    path = artifact_path(file_name)
+    start = time.perf_counter()
+    try:
+        with open(path + '.part', 'wb') as fileobj:
+            RENDERERS[job.format](fileobj, dataset_for(job))
+        os.replace(path + '.part', path)
+    except Exception as e:
+        logger.exception(f"Export job {job.pk} failed")
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'done'
+        job.file_name = file_name
+        job.size = os.path.getsize(path)
+        record_export('job', RENDERERS[job.format], time.perf_counter() - start, job.size)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'file_name', 'size', 'finished_at'])
+
+    evict_artifacts()
+
+
+def requeue_stale_jobs(timeout=None):
+    """
+    Put jobs that have been running for longer than `timeout` seconds (the
+    worker rendering them crashed or was restarted) back to pending.
+    Returns the number of jobs requeued.
+    """
+    if timeout is None:
+        timeout = settings.EXPORT_JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = ExportJob.objects.filter(status='running', started_at__lt=cutoff)
+    for job in stale:
+        logger.warning(f"Export job {job.pk} ran past {timeout}s, requeueing it")
+    return stale.update(status='pending', started_at=None)
+
+
+def _expire(job):
+    """
+    Mark `job` expired and delete its file. Pool threads and
+    run_export_jobs may evict at the same time; only the one that flips the
+    status counts the job, and a file already gone is fine.
+    """
+    if not ExportJob.objects.filter(pk=job.pk, status='done').update(status='expired'):
+        return False
+    job.status = 'expired'
+    if job.file_name:
+        try:
+            os.remove(artifact_path(job.file_name))
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def evict_artifacts(max_age=None, max_bytes=None):
+    """
+    Delete finished files older than `max_age` seconds, then the oldest
+    remaining ones until the total size fits in `max_bytes`. Returns the
+    number of jobs expired.
+    """
+    if max_age is None:
+        max_age = settings.EXPORT_ARTIFACT_MAX_AGE
+    if max_bytes is None:
+        max_bytes = settings.EXPORT_ARTIFACT_MAX_BYTES
+
+    evicted = 0
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    for job in ExportJob.objects.filter(status='done', finished_at__lt=cutoff):
+        evicted += _expire(job)
+
+    total = 0
+    for job in ExportJob.objects.filter(status='done').order_by('-finished_at', '-id'):
+        total += job.size
+        if total > max_bytes:
+            evicted += _expire(job)
+    return evicted
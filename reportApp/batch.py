@@ -0,0 +1,132 @@
+# report/batch.py
+"""
+Batch status and level changes for many reports at once.
+
+A batch selects reports either by id or by filters and applies the change
+with a single UPDATE. The rollup rows the changed reports move between are
+adjusted from one grouped count taken before the update, since
+QuerySet.update() skips the signals that normally maintain them.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from RRA_report_backend.responsecache import bump_version
+from RRA_report_backend.stats import parse_bound
+from userApp.hierarchy import subtree_user_ids
+from .models import Report
+from .rollups import apply_report_rollup_deltas, rebuild_report_rollups
+
+FILTERS = ('level', 'created_by', 'subtree', 'depth', 'status', 'from', 'to')
+
+
+def batch_selection(data):
+    """
+    Reports picked by a batch request body: {"ids": [...]}, or any of
+    level, created_by, subtree (a user id; everyone below them), depth,
+    status (approved|pending), from and to.
+    """
+    ids = data.get('ids')
+    if ids is not None:
+        if any(key in data for key in FILTERS):
+            raise ValidationError({"ids": "Select reports by ids or by filters, not both."})
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)):
+            raise ValidationError({"ids": "Must be a non-empty list of report ids."})
+        if len(ids) > settings.REPORT_BATCH_MAX_IDS:
+            raise ValidationError({"ids": f"At most {settings.REPORT_BATCH_MAX_IDS} ids per request."})
+        return Report.objects.filter(pk__in=ids)
+
+    if not any(data.get(key) not in (None, '') for key in FILTERS if key != 'depth'):
+        raise ValidationError({"error": "Give report ids or at least one filter."})
+    reports = Report.objects.all()
+    if data.get('level'):
+        if data['level'] not in dict(Report.LEVEL_CHOICES):
+            raise ValidationError({"level": "Unknown level."})
+        reports = reports.filter(level=data['level'])
+    if data.get('status'):
+        if data['status'] not in ('approved', 'pending'):
+            raise ValidationError({"status": "Must be 'approved' or 'pending'."})
+        reports = reports.filter(status=data['status'] == 'approved')
+    for key in ('created_by', 'subtree', 'depth'):
+        if data.get(key) is not None and (not isinstance(data[key], int) or data[key] < 1):
+            raise ValidationError({key: "Must be a positive integer."})
+    if data.get('created_by'):
+        reports = reports.filter(created_by_id=data['created_by'])
+    if data.get('subtree'):
+        reports = reports.filter(created_by_id__in=subtree_user_ids(data['subtree'], data.get('depth')))
+    try:
+        if data.get('from'):
+            reports = reports.filter(created_date__gte=parse_bound(data['from']))
+        if data.get('to'):
+            reports = reports.filter(created_date__lt=parse_bound(data['to'], end=True))
+    except (TypeError, ValueError) as e:
+        raise ValidationError({"error": str(e)})
+    return reports
+
+
+def batch_changes(data):
+    """The {"status": bool, "level": str} changes of a batch update body."""
+    changes = data.get('set')
+    if not isinstance(changes, dict) or not changes or set(changes) - {'status', 'level'}:
+        raise ValidationError({"set": "Give a new 'status' and/or 'level'."})
+    if 'status' in changes and not isinstance(changes['status'], bool):
+        raise ValidationError({"set": "'status' must be true or false."})
+    if 'level' in changes and changes['level'] not in dict(Report.LEVEL_CHOICES):
+        raise ValidationError({"set": "Unknown level."})
+    return changes
+
+
+def batch_update(reports, changes, dry_run=False):
+    """
+    Apply `changes` to every report in `reports` with one UPDATE. Returns
+    how many reports matched and how many of them actually changed (or
+    would change, with dry_run).
+    """
+    differs = Q()
+    for field, value in changes.items():
+        differs |= ~Q(**{field: value})
+    changing = reports.filter(differs)
+
+    if dry_run:
+        groups = changed_groups(changing)
+        return {'matched': reports.count(), 'updated': sum(group['count'] for group in groups), 'dry_run': True}
+
+    with transaction.atomic():
+        groups = changed_groups(changing)
+        expected = sum(group['count'] for group in groups)
+        result = {'matched': reports.count(), 'updated': expected, 'dry_run': False}
+        if not expected:
+            return result
+
+        # QuerySet.update() bypasses auto_now
+        result['updated'] = changing.update(updated_at=timezone.now(), **changes)
+        bump_version(Report)
+        if result['updated'] == expected:
+            deltas = Counter()
+            for group in groups:
+                old = (group['day'], group['level'], group['status'])
+                new = (group['day'], changes.get('level', group['level']), changes.get('status', group['status']))
+                deltas[old] -= group['count']
+                deltas[new] += group['count']
+            apply_report_rollup_deltas(deltas)
+        else:
+            # Rows changed between the count and the update: recount the
+            # affected days instead.
+            days = [group['day'] for group in groups]
+            rebuild_report_rollups(min(days), max(days))
+    return result
+
+
+def changed_groups(changing):
+    """Reports about to change, counted per rollup key."""
+    return list(
+        changing.annotate(day=TruncDate('created_date'))
+        .values('day', 'level', 'status')
+        .annotate(count=Count('pk'))
+    )
@@ -0,0 +1,502 @@
+# report/benchmarks.py
+"""
+Benchmark scenarios run by `manage.py benchmark`.
+
+Each scenario receives the dataset sizes to measure and the number of
+repetitions per measurement, seeds the (throwaway) test database itself and
+returns a list of result rows. COMPARE names, per scenario, the columns
+that identify a row and the lower-is-better columns `benchmark --compare`
+checks against a baseline.
+"""
+import itertools
+import logging
+import statistics
+import time
+import tracemalloc
+from importlib import import_module
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from RRA_report_backend.fastread import ReadPlan
+from RRA_report_backend.responsecache import response_cache
+from userApp.authentication import CachedJWTAuthentication, user_cache
+from userApp.models import CustomUser
+from userApp.serializers import UserSerializer
+from userApp.tokens import RefreshToken
+
+from .models import Report
+from .pagination import CreatedDateCursorPagination
+from .rollups import rebuild_report_rollups
+from .seed import LEVELS, build_user, seed_hierarchy, seed_reports, seed_users
+from .serializers import ReportSerializer
+from .views import ReportByIdView
+
+
+def time_get(client, url, repeat):
+    """Median latency of `repeat` GETs to `url`, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def authenticated_client():
+    client = APIClient()
+    client.force_authenticate(seed_users(1, role='admin')[0])
+    return client
+
+
+def report_cursor_url(depth):
+    """URL of the report list page that starts `depth` rows from the top."""
+    url = reverse('report-list')
+    position = Report.objects.order_by('-created_date', '-id').values_list('created_date', flat=True)[depth]
+    paginator = CreatedDateCursorPagination()
+    paginator.base_url = url
+    return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+
+
+def bench_pagination(sizes, repeat):
+    """First page vs. a page 90% deep into the report list as the table grows."""
+    client = authenticated_client()
+    users = seed_users(50)
+    results = []
+    seeded = 0
+    for size in sorted(sizes):
+        seed_reports(size - seeded, users, seed=size)
+        seeded = size
+        results.append({
+            'rows': size,
+            'first_page_ms': time_get(client, reverse('report-list'), repeat),
+            'deep_page_ms': time_get(client, report_cursor_url(int(size * 0.9)), repeat),
+        })
+    return results
+
+
+def bench_exports(sizes, repeat):
+    """
+    Wall time, Python peak memory and file size of the all-reports PDF and
+    Excel downloads. Each export is run once per size because tracemalloc
+    slows rendering down; treat the timings as relative.
+    """
+    client = authenticated_client()
+    users = seed_users(50)
+    results = []
+    seeded = 0
+    for size in sorted(sizes):
+        seed_reports(size - seeded, users, seed=size)
+        seeded = size
+        for name in ('report-download-all-pdf', 'report-download-all-excel'):
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get(reverse(name))
+            length = sum(len(block) for block in response.streaming_content)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert response.status_code == 200, (name, response.status_code)
+            results.append({
+                'rows': size,
+                'export': name.rsplit('-', 1)[-1],
+                'seconds': round(elapsed, 2),
+                'peak_mb': round(peak / 2 ** 20, 1),
+                'file_mb': round(length / 2 ** 20, 1),
+            })
+    return results
+
+
+def bench_auth(sizes, repeat):
+    """
+    Queries and median latency of a warm report detail GET sent with a real
+    bearer token, through the stock and the caching JWT authentication.
+    `sizes` is the number of users in the table.
+    """
+    factory = APIRequestFactory()
+    results = []
+    seeded = 0
+    for size in sorted(sizes):
+        users = seed_users(size - seeded)
+        seeded = size
+        seed_reports(1, users[-1:], seed=size)
+        report = Report.objects.latest('id')
+        header = f'Bearer {AccessToken.for_user(users[-1])}'
+        for authentication in (JWTAuthentication, CachedJWTAuthentication):
+            view = ReportByIdView.as_view(authentication_classes=[authentication])
+            user_cache.clear()
+            samples = []
+            for _ in range(repeat + 1):
+                request = factory.get(reverse('report-detail', args=[report.id]), HTTP_AUTHORIZATION=header)
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request, pk=report.id)
+                samples.append(time.perf_counter() - start)
+                assert response.status_code == 200, (authentication.__name__, response.status_code)
+            results.append({
+                'users': size,
+                'authentication': authentication.__name__,
+                'queries': len(queries),
+                'median_ms': round(statistics.median(samples[1:]) * 1000, 2),
+            })
+    return results
+
+
+def bench_approvals(sizes, repeat):
+    """
+    Approving `size` pending reports one request at a time vs. one batch
+    request. Each approach runs once per size on a fresh set of reports.
+    """
+    client = authenticated_client()
+    users = seed_users(50)
+    results = []
+    for size in sorted(sizes):
+        for approach in ('individual', 'batch'):
+            Report.objects.all().delete()
+            seed_reports(size, users, seed=size)
+            Report.objects.update(status=False)
+            rebuild_report_rollups()
+            pending = list(Report.objects.values_list('id', flat=True))
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                if approach == 'individual':
+                    for pk in pending:
+                        response = client.put(reverse('report-approve', args=[pk]))
+                        assert response.status_code == 200, response.status_code
+                else:
+                    response = client.post(reverse('report-batch-approve'), {'ids': pending}, format='json')
+                    assert response.status_code == 200, response.status_code
+            results.append({
+                'reports': len(pending),
+                'approach': approach,
+                'seconds': round(time.perf_counter() - start, 3),
+                'queries': len(queries),
+            })
+    return results
+
+
+def bench_serialization(sizes, repeat):
+    """
+    Rows per second turned into JSON by the serializers (model instances)
+    and by the values() fast path, for `size` reports and `size` users.
+    Both include the query and rendering; the bytes must be identical.
+    """
+    renderer = JSONRenderer()
+    cases = [
+        ('reports', lambda: Report.objects.select_related('created_by').order_by('-created_date', '-id'),
+         ReportSerializer),
+        ('users', lambda: CustomUser.objects.order_by('-created_at', '-id'), UserSerializer),
+    ]
+    results = []
+    users = seed_users(50)
+    seeded_reports = 0
+    seeded_users = len(users) + 1
+    for size in sorted(sizes):
+        seed_reports(size - seeded_reports, users, seed=size)
+        seed_users(max(size - seeded_users, 0))
+        seeded_reports, seeded_users = size, max(size, seeded_users)
+        for name, queryset, serializer_class in cases:
+            rendered = {}
+            for path in ('serializer', 'fast'):
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    if path == 'serializer':
+                        body = renderer.render(serializer_class(queryset(), many=True).data)
+                    else:
+                        plan = ReadPlan.for_serializer(serializer_class())
+                        body = renderer.render(plan.represent(plan.rows(queryset())))
+                    samples.append(time.perf_counter() - start)
+                rendered[path] = body
+                seconds = statistics.median(samples)
+                results.append({
+                    'rows': size,
+                    'model': name,
+                    'path': path,
+                    'median_ms': round(seconds * 1000, 1),
+                    'rows_per_s': int(size / seconds),
+                })
+            assert rendered['serializer'] == rendered['fast'], name
+    return results
+
+
+class EndpointContext:
+    """
+    What the endpoint requests draw on: the seeded org tree, a pool of
+    report ids, and fresh rows and unique values for requests that
+    consume them.
+    """
+
+    def __init__(self, admin, levels):
+        self.admin = admin
+        self.head = levels[0][0]
+        self.unit = (levels[2] or levels[1] or levels[0])[0]
+        self.password_hash = self.unit.password
+        self.numbers = itertools.count(1)
+        self.scratch = self.user()
+        self.renamed = self.user()
+        self.load_reports()
+
+    def load_reports(self):
+        """Pick the reports to work on; called again after seeding more."""
+        self.report = Report.objects.filter(created_by=self.unit).first() or Report.objects.first()
+        self.report_ids = list(Report.objects.order_by('id').values_list('id', flat=True)[:5000])
+
+    def number(self):
+        return next(self.numbers)
+
+    def user(self):
+        # Numbered far above the seeded users so names never collide.
+        user = build_user(10 ** 8 + self.number(), 'unit user', self.admin, self.password_hash)
+        user.save()
+        return user
+
+    def new_report(self):
+        return Report.objects.create(created_by=self.unit, level='unit', title='Scratch report',
+                                     description='Created for a benchmark request.')
+
+    def report_window(self, size=100):
+        start = self.number() * size % max(len(self.report_ids) - size, 1)
+        return self.report_ids[start:start + size]
+
+    def signup(self):
+        n = self.number()
+        return {'first_name': 'Bench', 'last_name': f'User{n}', 'email': f'bench_{n}@gmail.com',
+                'phone': f'078{n:07d}', 'role': 'unit user'}
+
+    def import_file(self, rows=5):
+        lines = ['first_name,last_name,email,phone,role']
+        for _ in range(rows):
+            row = self.signup()
+            lines.append(','.join(row[column] for column in ('first_name', 'last_name', 'email', 'phone', 'role')))
+        return SimpleUploadedFile('users.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+
+def json_body(data):
+    return {'data': data, 'format': 'json'}
+
+
+# URL name -> request for it: (method, args for reverse(), query string,
+# client keyword arguments). Built fresh, outside the timing, per request.
+ENDPOINTS = {
+    # reportApp
+    'report-create': lambda ctx: ('post', [], '', json_body({'title': 'Bench report', 'description': 'Benchmark.'})),
+    'report-update': lambda ctx: ('patch', [ctx.report.id], '', json_body({'title': f'Report {ctx.number()}'})),
+    'report-batch-update': lambda ctx: ('post', [], '', json_body({
+        'ids': ctx.report_window(), 'set': {'level': LEVELS[ctx.number() % len(LEVELS)]}})),
+    'report-delete': lambda ctx: ('delete', [ctx.new_report().id], '', {}),
+    'report-list': lambda ctx: ('get', [], '', {}),
+    'report-by-level': lambda ctx: ('get', ['unit'], '', {}),
+    'report-detail': lambda ctx: ('get', [ctx.report.id], '', {}),
+    'report-by-title': lambda ctx: ('get', ['Report 42'], '', {}),
+    'report-by-user': lambda ctx: ('get', [ctx.unit.username], '', {}),
+    'report-search': lambda ctx: ('get', [], '?q=synthetic+report+42', {}),
+    'report-count': lambda ctx: ('get', [], '', {}),
+    'report-trend': lambda ctx: ('get', [], '', {}),
+    'report-download-pdf': lambda ctx: ('get', [ctx.report.id], '', {}),
+    'report-download-excel': lambda ctx: ('get', [ctx.report.id], '', {}),
+    'report-download-all-pdf': lambda ctx: ('get', [], '', {}),
+    'report-download-all-excel': lambda ctx: ('get', [], '', {}),
+    'reports-by-creator': lambda ctx: ('get', [ctx.unit.id], '', {}),
+    'reports-by-subordinates': lambda ctx: ('get', [ctx.head.id], '', {}),
+    'reports-by-subordinates-summary': lambda ctx: ('get', [ctx.head.id], '', {}),
+    'report-approve': lambda ctx: ('put', [ctx.report_window(1)[0]], '', {}),
+    'report-batch-approve': lambda ctx: ('post', [], '', json_body({'ids': ctx.report_window()})),
+    # userApp
+    'index': lambda ctx: ('get', [], '', {}),
+    'signup': lambda ctx: ('post', [], '', json_body(ctx.signup())),
+    'user-import': lambda ctx: ('post', [], '', {'data': {'file': ctx.import_file()}, 'format': 'multipart'}),
+    'login': lambda ctx: ('post', [], '', json_body({'username': ctx.unit.username, 'password': 'password'})),
+    'user-list': lambda ctx: ('get', [], '', {}),
+    'user-detail': lambda ctx: ('get', [ctx.unit.id], '', {}),
+    'user-update': lambda ctx: ('patch', [ctx.scratch.id], '', json_body({'first_name': f'First{ctx.number()}'})),
+    'user-delete': lambda ctx: ('delete', [ctx.user().id], '', {}),
+    'user-by-username': lambda ctx: ('get', [ctx.unit.username], '', {}),
+    'user-by-email': lambda ctx: ('get', [ctx.unit.email], '', {}),
+    'user-by-phone': lambda ctx: ('get', [ctx.unit.phone], '', {}),
+    'user-by-firstname': lambda ctx: ('get', [ctx.unit.first_name], '', {}),
+    'user-by-lastname': lambda ctx: ('get', [ctx.unit.last_name], '', {}),
+    'password-reset': lambda ctx: ('post', [], '', json_body({'username': ctx.scratch.username})),
+    'update-username': lambda ctx: ('post', [], '', json_body({
+        'email': ctx.renamed.email, 'new_username': f'bench_renamed_{ctx.number()}'})),
+    'user-count': lambda ctx: ('get', [], '', {}),
+    'user-trends': lambda ctx: ('get', [], '', {}),
+    'user-download-pdf': lambda ctx: ('get', [], '', {}),
+    'user-download-excel': lambda ctx: ('get', [], '', {}),
+    'logout': lambda ctx: ('post', [], '', json_body({'refresh_token': str(RefreshToken.for_user(ctx.scratch))})),
+    'created-users-list': lambda ctx: ('get', [], '', {}),
+    'contact_us': lambda ctx: ('post', [], '', json_body({
+        'name': 'Bench', 'email': 'bench@gmail.com', 'subject': 'Benchmark', 'description': 'Hello.'})),
+}
+
+# Whole-table exports: measured at most this many times per size.
+HEAVY_ENDPOINTS = {'report-download-all-pdf', 'report-download-all-excel',
+                   'user-download-pdf', 'user-download-excel'}
+HEAVY_REPEAT = 3
+
+
+def url_names(*urlconfs):
+    return [pattern.name for urlconf in urlconfs for pattern in import_module(urlconf).urlpatterns]
+
+
+def missing_endpoints():
+    """URL names of reportApp and userApp that ENDPOINTS has no request for."""
+    return [name for name in url_names('reportApp.urls', 'userApp.urls') if name not in ENDPOINTS]
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting queries. Unlike CaptureQueriesContext it is not
+    thrown off by request_started resetting connection.queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentiles(samples):
+    """p50, p90 and p99 of `samples`, in milliseconds."""
+    if len(samples) == 1:
+        cuts = samples * 3
+    else:
+        quantiles = statistics.quantiles(samples, n=100, method='inclusive')
+        cuts = [statistics.median(samples), quantiles[89], quantiles[98]]
+    return [round(cut * 1000, 2) for cut in cuts]
+
+
+def prepare(ctx, name):
+    """The request for endpoint `name`: (method, url, client keyword arguments)."""
+    method, args, query, options = ENDPOINTS[name](ctx)
+    return method, reverse(name, args=args) + query, options
+
+
+def send(client, ctx, name, request):
+    """Send a prepared request as the admin; returns the seconds it took."""
+    method, url, options = request
+    # Fresh token each time: whole-table exports can outlive one.
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(ctx.admin)}')
+    response_cache().clear()
+    start = time.perf_counter()
+    response = getattr(client, method)(url, **options)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    elapsed = time.perf_counter() - start
+    assert response.status_code < 300, (name, response.status_code, getattr(response, 'data', None))
+    return elapsed
+
+
+def bench_endpoints(sizes, repeat):
+    """
+    Every URL of reportApp and userApp through the test client with a real
+    bearer token, as the report table grows. The org tree (max(sizes) / 20
+    users, at least 50) is seeded once. Per endpoint and size: one warm-up
+    request that also records queries and Python peak memory, then `repeat`
+    timed requests (HEAVY_REPEAT for whole-table exports) for the latency
+    percentiles. Cached responses are cleared before every request and
+    INFO logging is silenced while measuring.
+    """
+    missing = missing_endpoints()
+    assert not missing, f'No benchmark request for: {", ".join(missing)}'
+
+    client = APIClient()
+    admin = seed_users(1, role='admin')[0]
+    levels = seed_hierarchy(max(max(sizes) // 20, 50), admin)
+    logging.disable(logging.INFO)
+    try:
+        with override_settings(EMAIL_OUTBOX_THREAD=False):
+            results = measure_endpoints(client, admin, levels, sizes, repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def measure_endpoints(client, admin, levels, sizes, repeat):
+    users = [user for level in levels for user in level]
+    results = []
+    seeded = 0
+    ctx = None
+    for size in sorted(sizes):
+        seed_reports(size - seeded, users, seed=size)
+        seeded = size
+        if ctx is None:
+            ctx = EndpointContext(admin, levels)
+        else:
+            ctx.load_reports()
+        for name in ENDPOINTS:
+            request = prepare(ctx, name)
+            queries = QueryCounter()
+            tracemalloc.start()
+            with connection.execute_wrapper(queries):
+                send(client, ctx, name, request)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            runs = min(repeat, HEAVY_REPEAT) if name in HEAVY_ENDPOINTS else repeat
+            samples = [send(client, ctx, name, prepare(ctx, name)) for _ in range(runs)]
+            p50, p90, p99 = percentiles(samples)
+            results.append({
+                'reports': size,
+                'endpoint': name,
+                'p50_ms': p50,
+                'p90_ms': p90,
+                'p99_ms': p99,
+                'queries': queries.count,
+                'peak_kb': round(peak / 1024),
+            })
+    return results
+
+
+SCENARIOS = {
+    'pagination': bench_pagination,
+    'exports': bench_exports,
+    'auth': bench_auth,
+    'approvals': bench_approvals,
+    'serialization': bench_serialization,
+    'endpoints': bench_endpoints,
+}
+
+# scenario -> (columns identifying a row, columns compared for regressions)
+COMPARE = {
+    'pagination': (('rows',), ('first_page_ms', 'deep_page_ms')),
+    'exports': (('rows', 'export'), ('seconds', 'peak_mb')),
+    'auth': (('users', 'authentication'), ('queries', 'median_ms')),
+    'approvals': (('reports', 'approach'), ('seconds', 'queries')),
+    'serialization': (('rows', 'model', 'path'), ('median_ms',)),
+    'endpoints': (('reports', 'endpoint'), ('p50_ms', 'p90_ms', 'p99_ms', 'queries', 'peak_kb')),
+}
+
+
+def compare_results(scenario, baseline, results, threshold):
+    """
+    Rows of `results` matched to `baseline` rows, each metric with its
+    relative change. A metric regresses when it grew by more than
+    `threshold` (0.2 = 20%) over a non-zero baseline, or from zero.
+    """
+    keys, metrics = COMPARE[scenario]
+    previous = {tuple(row[key] for key in keys): row for row in baseline}
+    comparisons = []
+    for row in results:
+        key = tuple(row[column] for column in keys)
+        old = previous.get(key)
+        for metric in metrics:
+            if old is None or old.get(metric) is None:
+                comparisons.append({'key': key, 'metric': metric, 'baseline': None, 'current': row[metric],
+                                    'change': None, 'regression': False})
+                continue
+            before, after = old[metric], row[metric]
+            change = (after - before) / before if before else (float('inf') if after else 0.0)
+            comparisons.append({'key': key, 'metric': metric, 'baseline': before, 'current': after,
+                                'change': change, 'regression': change > threshold})
+    return comparisons
@@ -0,0 +1,46 @@
+# report/exports.py
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.utils.timezone import make_naive
+
+from exportApp.renderers import ExportDataset
+from .models import Report
+
+HEADERS = ["ID", "Created By", "Level", "Title", "Description", "Created Date"]
+COLUMNS = ['id', 'created_by__username', 'level', 'title', 'description', 'created_date']
+
+# str() of a naive datetime with microseconds, e.g. 2024-07-20 11:47:03.123456
+DATETIME_LENGTH = 26
+
+
+def report_dataset(queryset=None, title="All Reports", chunk_size=2000):
+    """
+    Describe the reports in `queryset` for the export renderers: column
+    widths come from one aggregate query and rows are streamed with a
+    chunked iterator over a single joined query.
+    """
+    if queryset is None:
+        queryset = Report.objects.all()
+
+    lengths = queryset.aggregate(
+        id=Max('id'),
+        created_by=Max(Length('created_by__username')),
+        level=Max(Length('level')),
+        title=Max(Length('title')),
+        description=Max(Length('description')),
+    )
+    max_lengths = [
+        len(str(lengths['id'] or '')),
+        lengths['created_by'],
+        lengths['level'],
+        lengths['title'],
+        lengths['description'],
+        DATETIME_LENGTH,
+    ]
+
+    def rows():
+        for row in queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size):
+            # Excel cannot store timezone-aware datetimes
+            yield row[:-1] + (make_naive(row[-1]),)
+
+    return ExportDataset(title, HEADERS, rows(), max_lengths)
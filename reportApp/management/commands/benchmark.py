@@ -0,0 +1,95 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from reportApp.benchmarks import SCENARIOS, compare_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a benchmark scenario against a throwaway test database (SQLite or '
+        'PostgreSQL, from DATABASE_URL). --output stores the results as a JSON '
+        'baseline; --compare checks them against one and fails on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated dataset sizes to measure.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Requests per measurement; the median is reported.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Baseline JSON file to compare the results with.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative growth of a metric counted as a regression (default 0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["compare"]}: {e}')
+            if baseline.get('scenario') != options['scenario']:
+                raise CommandError(f'{options["compare"]} is a baseline for {baseline.get("scenario")!r}, '
+                                   f'not {options["scenario"]!r}')
+
+        # Never seed the real database: benchmark inside a fresh test
+        # database, with DEBUG off and the locmem mail backend like the tests.
+        setup_test_environment(debug=False)
+        vendor = connection.vendor
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = SCENARIOS[options['scenario']](sizes, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if not results:
+            return
+        columns = list(results[0])
+        self.stdout.write('  '.join(f'{column:>16}' for column in columns))
+        for row in results:
+            self.stdout.write('  '.join(f'{row[column]!s:>16}' for column in columns))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'scenario': options['scenario'],
+                    'sizes': sizes,
+                    'repeat': options['repeat'],
+                    'database': vendor,
+                    'python': platform.python_version(),
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            self.report_comparison(options['scenario'], baseline, options['compare'], results, options['threshold'])
+
+    def report_comparison(self, scenario, baseline, baseline_name, results, threshold):
+        if baseline.get('database') not in (None, connection.vendor):
+            self.stderr.write(f'Warning: the baseline was measured on {baseline["database"]}.')
+        comparisons = compare_results(scenario, baseline['results'], results, threshold)
+        regressions = [c for c in comparisons if c['regression']]
+        unmatched = [c for c in comparisons if c['change'] is None]
+        self.stdout.write('')
+        for c in unmatched + regressions:
+            change = 'not in baseline' if c['change'] is None else f'{c["change"]:+.1%}'
+            line = (f'{" / ".join(map(str, c["key"]))}  {c["metric"]}: '
+                    f'{c["baseline"]} -> {c["current"]} ({change})')
+            self.stdout.write(self.style.ERROR(line) if c['regression'] else line)
+        self.stdout.write(f'{len(comparisons) - len(unmatched)} metric(s) compared with {baseline_name}.')
+        if regressions:
+            raise CommandError(f'{len(regressions)} metric(s) regressed by more than {threshold:.0%}.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {threshold:.0%}.'))
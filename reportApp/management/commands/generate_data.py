@@ -0,0 +1,85 @@
+import random
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from reportApp.rollups import rebuild_report_rollups
+from reportApp.seed import analyze, bulk_insert_reports, copy_reports, generate_org, report_rows
+from userApp.rollups import rebuild_user_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database (from DATABASE_URL) with a synthetic org tree and '
+        'reports for load testing: an admin, division heads, department heads '
+        'and unit users linked through created_by, and their reports spread '
+        'over the last --days days. Every user gets the same --password.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000,
+                            help='Users below the admin.')
+        parser.add_argument('--reports', type=int, default=1000000)
+        parser.add_argument('--days', type=int, default=365 * 3,
+                            help='Days of history the reports are spread over.')
+        parser.add_argument('--fanout', type=int, default=10,
+                            help='Children per parent in the org tree.')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows per INSERT or COPY.')
+        parser.add_argument('--method', choices=['auto', 'bulk', 'copy'], default='auto',
+                            help='copy (PostgreSQL only) or bulk_create; auto picks copy when possible.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable datasets.')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--force', action='store_true',
+                            help='Allow running with DEBUG off, i.e. against a production-like database.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; pass --force to generate data in this database anyway.')
+        if options['users'] < 0 or options['reports'] < 0:
+            raise CommandError('--users and --reports cannot be negative.')
+        if min(options['days'], options['fanout'], options['batch_size']) < 1:
+            raise CommandError('--days, --fanout and --batch-size must be positive.')
+        if options['reports'] and not options['users']:
+            raise CommandError('Reports need --users to write them.')
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('--method copy needs PostgreSQL.')
+
+        rng = random.Random(options['seed'])
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+        began = perf_counter()
+
+        # One PBKDF2 run for everyone instead of one per user.
+        password_hash = make_password(options['password'])
+        levels = generate_org(options['users'], options['fanout'], password_hash, start,
+                              (end - start) / 10, rng, options['batch_size'])
+        users = [user for level in levels for user in level]
+        self.stdout.write(f'Users: {len(users)} ({", ".join(str(len(level)) for level in levels)} per level) '
+                          f'in {perf_counter() - began:.1f}s')
+
+        insert = copy_reports if method == 'copy' else bulk_insert_reports
+        rows = report_rows(options['reports'], users, start, end, rng)
+        written, reports_began = 0, perf_counter()
+        step = max(options['reports'] // 20, options['batch_size'])
+        for count in insert(rows, options['batch_size']):
+            previous, written = written, written + count
+            if written // step > previous // step or written == options['reports']:
+                elapsed = perf_counter() - reports_began
+                self.stdout.write(f'Reports: {written}/{options["reports"]} '
+                                  f'({written / elapsed:,.0f} rows/s, {method})')
+
+        # Bulk writes skip the signals that maintain the rollup tables.
+        rebuild_user_rollups()
+        rebuild_report_rollups()
+        analyze()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users and {written} reports in {perf_counter() - began:.1f}s.'))
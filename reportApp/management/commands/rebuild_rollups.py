@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from reportApp.rollups import rebuild_report_rollups
+from userApp.rollups import rebuild_user_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the daily report and user rollup tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='first_day', help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='last_day', help='Last day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--batch-days', type=int, default=31,
+                            help='Days recomputed per transaction.')
+        parser.add_argument('--only', choices=['reports', 'users'])
+
+    def parse_day(self, value):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return day
+
+    def handle(self, *args, **options):
+        first_day = self.parse_day(options['first_day'])
+        last_day = self.parse_day(options['last_day'])
+        if options['only'] != 'users':
+            rows = rebuild_report_rollups(first_day, last_day, options['batch_days'])
+            self.stdout.write(f'Report rollups: {rows} row(s) written.')
+        if options['only'] != 'reports':
+            rows = rebuild_user_rollups(first_day, last_day, options['batch_days'])
+            self.stdout.write(f'User rollups: {rows} row(s) written.')
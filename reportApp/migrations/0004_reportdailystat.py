@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 13:45
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    Report = apps.get_model('reportApp', 'Report')
+    ReportDailyStat = apps.get_model('reportApp', 'ReportDailyStat')
+    rows = (Report.objects.annotate(date=TruncDate('created_date'))
+            .values('date', 'level', 'status')
+            .annotate(count=Count('pk'))
+            .order_by())
+    ReportDailyStat.objects.bulk_create([ReportDailyStat(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportApp', '0003_report_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('level', models.CharField(max_length=20)),
+                ('status', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reportdailystat',
+            constraint=models.UniqueConstraint(fields=('date', 'level', 'status'), name='reportdailystat_unique_key'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
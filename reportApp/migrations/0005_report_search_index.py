@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from reportApp.search import install_search_index
+    install_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from reportApp.search import remove_search_index
+    remove_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportApp', '0004_reportdailystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
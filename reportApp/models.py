@@ -14,7 +14,39 @@ class Report(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
     created_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     status = models.BooleanField(default=False)
 
+    class Meta:
+        # Matched to the list views, which filter on one of these columns
+        # and page on (created_date, id).
+        indexes = [
+            models.Index(fields=['created_date', 'id'], name='report_created_idx'),
+            models.Index(fields=['level', 'created_date', 'id'], name='report_level_created_idx'),
+            models.Index(fields=['created_by', 'created_date', 'id'], name='report_creator_created_idx'),
+            models.Index(fields=['created_date', 'id'], condition=models.Q(status=False),
+                         name='report_pending_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
+
+
+class ReportDailyStat(models.Model):
+    """
+    Number of reports created per day, level and status. Kept up to date by
+    the signals in reportApp.signals; `manage.py rebuild_rollups` recomputes
+    it from the reports table.
+    """
+    date = models.DateField()
+    level = models.CharField(max_length=20)
+    status = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'level', 'status'], name='reportdailystat_unique_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.level} {self.status}: {self.count}'
@@ -0,0 +1,28 @@
+# report/pagination.py
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedDateCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_date, id), newest first.
+
+    The cursor is an opaque token holding the last seen position, so fetching
+    a deep page costs the same indexed range scan as fetching the first one.
+    Page size comes from settings.PAGINATION_PAGE_SIZE and can be overridden
+    per request with ?page_size= up to max_page_size.
+    """
+    ordering = ('-created_date', '-id')
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Numbered pages for relevance-ordered search results, which have no
+    stable key to build a cursor from.
+    """
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
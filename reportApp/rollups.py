@@ -0,0 +1,105 @@
+# report/rollups.py
+"""
+Maintenance of the ReportDailyStat rollup table.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from RRA_report_backend.responsecache import bump_version
+
+from .models import Report, ReportDailyStat
+
+
+def rollup_key(created_date, level, status):
+    return timezone.localdate(created_date), level, status
+
+
+def bump_report_rollup(date, level, status, delta):
+    lookup = {'date': date, 'level': level, 'status': status}
+    if ReportDailyStat.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ReportDailyStat.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another request created the row first
+        ReportDailyStat.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def apply_report_rollup_deltas(deltas, chunk_days=500):
+    """
+    Apply a {(date, level, status): delta} mapping, e.g. after a bulk write,
+    with a few set-based statements however many keys it has.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    dates = sorted({date for date, _, _ in deltas})
+    with transaction.atomic():
+        existing = []
+        for start in range(0, len(dates), chunk_days):
+            rows = ReportDailyStat.objects.select_for_update().filter(date__in=dates[start:start + chunk_days])
+            existing.extend(row for row in rows if (row.date, row.level, row.status) in deltas)
+        for row in existing:
+            row.count += deltas[row.date, row.level, row.status]
+        ReportDailyStat.objects.bulk_update(existing, ['count'], batch_size=500)
+        found = {(row.date, row.level, row.status) for row in existing}
+        missing = [
+            ReportDailyStat(date=date, level=level, status=status, count=delta)
+            for (date, level, status), delta in deltas.items() if (date, level, status) not in found
+        ]
+        try:
+            with transaction.atomic():
+                ReportDailyStat.objects.bulk_create(missing, batch_size=500)
+        except IntegrityError:
+            # Another request created some of the rows first
+            for row in missing:
+                bump_report_rollup(row.date, row.level, row.status, row.count)
+    bump_version(Report)
+
+
+def day_bounds(first_day, last_day):
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    return start, end
+
+
+def rebuild_report_rollups(first_day=None, last_day=None, batch_days=31):
+    """
+    Recompute the rollup rows for [first_day, last_day] from the reports
+    table, `batch_days` days per transaction. Without bounds the whole table
+    is rebuilt and rows outside its date range are removed.
+    """
+    full = first_day is None and last_day is None
+    if first_day is None or last_day is None:
+        bounds = Report.objects.aggregate(first=Min('created_date'), last=Max('created_date'))
+        if bounds['first'] is None:
+            if full:
+                ReportDailyStat.objects.all().delete()
+            bump_version(Report)
+            return 0
+        first_day = first_day or timezone.localdate(bounds['first'])
+        last_day = last_day or timezone.localdate(bounds['last'])
+
+    if full:
+        ReportDailyStat.objects.exclude(date__range=(first_day, last_day)).delete()
+
+    written = 0
+    day = first_day
+    while day <= last_day:
+        batch_last = min(day + timedelta(days=batch_days - 1), last_day)
+        start, end = day_bounds(day, batch_last)
+        rows = (Report.objects.filter(created_date__gte=start, created_date__lt=end)
+                .annotate(date=TruncDate('created_date'))
+                .values('date', 'level', 'status')
+                .annotate(count=Count('pk'))
+                .order_by())
+        with transaction.atomic():
+            ReportDailyStat.objects.filter(date__range=(day, batch_last)).delete()
+            written += len(ReportDailyStat.objects.bulk_create([ReportDailyStat(**row) for row in rows]))
+        day = batch_last + timedelta(days=1)
+    # the count and trend responses are computed from the rollups
+    bump_version(Report)
+    return written
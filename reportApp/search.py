@@ -0,0 +1,116 @@
+# report/search.py
+"""
+Full-text search over report titles and descriptions.
+
+- PostgreSQL: a GIN expression index on the English tsvector of title and
+  description, queried with websearch syntax and ranked with ts_rank. The
+  index is maintained by PostgreSQL itself.
+- SQLite: an FTS5 external-content table mirroring the report table,
+  kept in sync by insert/update/delete triggers and ranked with bm25.
+- Anything else falls back to icontains with no ranking.
+
+Higher `rank` means more relevant on every backend.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, Value
+
+from .models import Report
+
+REPORT_TABLE = Report._meta.db_table
+FTS_TABLE = f'{REPORT_TABLE}_fts'
+POSTGRES_INDEX_NAME = 'report_search_idx'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        title, description, content='{REPORT_TABLE}', content_rowid='id'
+    )""",
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ai"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ad"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_au"',
+    f"""CREATE TRIGGER "{FTS_TABLE}_ai" AFTER INSERT ON "{REPORT_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER "{FTS_TABLE}_ad" AFTER DELETE ON "{REPORT_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER "{FTS_TABLE}_au" AFTER UPDATE OF title, description ON "{REPORT_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO "{FTS_TABLE}"(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+
+def postgres_search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('title', 'description', config='english')
+
+
+def install_search_index(schema_editor, rebuild=True):
+    """
+    Create the backend's search index. Safe to run repeatedly: the SQLite
+    triggers are recreated each time, because rebuilding the report table
+    during a migration drops them.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [POSTGRES_INDEX_NAME])
+            if cursor.fetchone():
+                return
+        schema_editor.add_index(Report, GinIndex(postgres_search_vector(), name=POSTGRES_INDEX_NAME))
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS_SQL:
+            schema_editor.execute(statement)
+        if rebuild:
+            schema_editor.execute(f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES (\'rebuild\')')
+
+
+def remove_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{POSTGRES_INDEX_NAME}"')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+
+
+def fts5_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, as a
+    prefix, and FTS5 operators typed by the user are treated as words.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search_reports(text, queryset=None):
+    """
+    Reports matching `text`, annotated with `rank` and ordered by relevance,
+    newest first among equals.
+    """
+    if queryset is None:
+        queryset = Report.objects.all()
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(text, search_type='websearch', config='english')
+        vector = postgres_search_vector()
+        queryset = (queryset.annotate(search=vector)
+                    .filter(search=query)
+                    .annotate(rank=SearchRank(vector, query)))
+    elif vendor == 'sqlite':
+        query = fts5_query(text)
+        if not query:
+            return queryset.none()
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'"{FTS_TABLE}".rowid = "{REPORT_TABLE}"."id"', f'"{FTS_TABLE}" MATCH %s'],
+            params=[query],
+            select={'rank': f'-bm25("{FTS_TABLE}")'},
+        )
+    else:
+        queryset = (queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+                    .annotate(rank=Value(0.0)))
+    return queryset.order_by('-rank', '-created_date', '-id')
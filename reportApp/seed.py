@@ -0,0 +1,267 @@
+# report/seed.py
+"""
+Bulk helpers for filling a database with synthetic users and reports.
+
+Rows are written with bulk_create (or COPY on PostgreSQL) and every user
+shares one precomputed password hash, so large datasets load in seconds
+instead of hours.
+"""
+import csv
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from userApp.models import CustomUser
+from userApp.rollups import rebuild_user_rollups
+from .models import Report
+from .rollups import rebuild_report_rollups
+
+LEVELS = [level for level, _ in Report.LEVEL_CHOICES]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    Temporarily turn off auto_now_add and auto_now on the given model
+    fields so that bulk_create keeps the timestamps set on the instances.
+    """
+    previous = [(field, field.auto_now_add, field.auto_now) for field in fields]
+    for field, _, _ in previous:
+        field.auto_now_add = field.auto_now = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add, auto_now in previous:
+            field.auto_now_add, field.auto_now = auto_now_add, auto_now
+
+
+def build_user(i, role, created_by, password_hash):
+    return CustomUser(
+        first_name=f'First{i}',
+        last_name=f'Last{i}',
+        username=f'seed_user_{i}',
+        email=f'seed_user_{i}@gmail.com',
+        phone=f'07{i:09d}',
+        role=role,
+        created_by=created_by,
+        password=password_hash,
+    )
+
+
+def seed_users(count, role='unit user', created_by=None, password='password', batch_size=1000):
+    start = CustomUser.objects.count()
+    password_hash = make_password(password)
+    users = [build_user(i, role, created_by, password_hash) for i in range(start, start + count)]
+    users = CustomUser.objects.bulk_create(users, batch_size=batch_size)
+    # bulk_create skips the signals that maintain the rollup tables
+    rebuild_user_rollups()
+    return users
+
+
+ORG_ROLES = ['head of division', 'head of department', 'unit user']
+
+# The level of the reports each role writes, as in ReportCreateView.
+ROLE_LEVELS = {'head of division': 'division', 'head of department': 'department', 'unit user': 'unit'}
+
+
+def org_sizes(count, fanout):
+    """Users per ORG_ROLES level of a `count` user tree with about `fanout` children per parent."""
+    top = min(count, max(1, round(count / (1 + fanout + fanout * fanout))))
+    middle = min(top * fanout, count - top)
+    return [top, middle, count - top - middle]
+
+
+def seed_hierarchy(count, root, fanout=10, password='password', batch_size=1000):
+    """
+    Create `count` users below `root` as an org tree: division heads
+    created by `root`, department heads spread over the division heads and
+    unit users over the department heads, about `fanout` children per
+    parent. Returns the users of each level, top level first.
+    """
+    start = CustomUser.objects.count()
+    password_hash = make_password(password)
+    levels = []
+    parents = [root]
+    for role, size in zip(ORG_ROLES, org_sizes(count, fanout)):
+        users = [build_user(start + i, role, parents[i % len(parents)], password_hash) for i in range(size)]
+        start += size
+        users = CustomUser.objects.bulk_create(users, batch_size=batch_size)
+        levels.append(users)
+        parents = users or parents
+    # bulk_create skips the signals that maintain the rollup tables
+    rebuild_user_rollups()
+    return levels
+
+
+def seed_reports(count, users, days=365 * 3, batch_size=5000, seed=0):
+    """
+    Create `count` reports spread over the last `days` days, each owned by a
+    random user from `users`.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    span = days * 24 * 3600
+    created_date = Report._meta.get_field('created_date')
+    with explicit_timestamps(created_date):
+        for offset in range(0, count, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, count)):
+                batch.append(Report(
+                    created_by=rng.choice(users),
+                    level=rng.choice(LEVELS),
+                    title=f'Report {i}',
+                    description=f'Synthetic report number {i}.',
+                    created_date=now - timedelta(seconds=rng.randrange(span), microseconds=rng.randrange(10 ** 6)),
+                    status=rng.random() < 0.6,
+                ))
+            Report.objects.bulk_create(batch)
+    # bulk_create skips the signals that maintain the rollup tables
+    rebuild_report_rollups()
+
+
+# Realistic-looking data for `manage.py generate_data`.
+
+LOREM = (
+    'The unit reviewed the filings received during the period and followed up on late submissions. '
+    'Most taxpayers in the sector declared on time; the remaining cases were referred for audit. '
+    'Collections were in line with the monthly target, with a small shortfall on import duties '
+    'that is expected to be recovered next quarter. Staff attended two trainings on the new '
+    'electronic billing machines and supported traders with registration and first declarations. '
+    'Outstanding issues include connectivity at two branch offices and a backlog of refund claims, '
+    'which the team plans to clear before the end of the month with support from headquarters.'
+)
+
+# Share of the reports written by each role.
+REPORT_SHARES = {'unit user': 0.8, 'head of department': 0.15, 'head of division': 0.05}
+
+REPORT_COLUMNS = ('created_by_id', 'level', 'title', 'description', 'created_date', 'updated_at', 'status')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def generate_org(count, fanout, password_hash, start, onboarding, rng, batch_size=10000):
+    """
+    Create an admin and `count` users below it as an ORG_ROLES tree joined
+    through created_by. Everyone joins during the `onboarding` timedelta
+    after `start`, after the user who created them. Returns the users of
+    each level, admin first.
+    """
+    created_at = CustomUser._meta.get_field('created_at')
+    updated_at = CustomUser._meta.get_field('updated_at')
+    end = start + onboarding
+    number = CustomUser.objects.count()
+    admin = build_user(number, 'admin', None, password_hash)
+    admin.is_admin = True
+    admin.created_at = admin.updated_at = start
+    levels = [[admin]]
+    with explicit_timestamps(created_at, updated_at):
+        CustomUser.objects.bulk_create(levels[0])
+        for role, size in zip(ORG_ROLES, org_sizes(count, fanout)):
+            parents = levels[-1]
+            users = []
+            for i in range(size):
+                number += 1
+                parent = parents[i % len(parents)]
+                user = build_user(number, role, parent, password_hash)
+                user.created_at = user.updated_at = parent.created_at + (end - parent.created_at) * rng.random()
+                users.append(user)
+            levels.append(CustomUser.objects.bulk_create(users, batch_size=batch_size))
+    return levels
+
+
+def report_rows(count, users, start, end, rng):
+    """
+    Yield `count` reports as REPORT_COLUMNS tuples. Authors are drawn by
+    REPORT_SHARES and write at their own level; reports fall on working
+    hours, mostly on weekdays, after the author joined. Older reports are
+    mostly approved, recent ones mostly pending.
+    """
+    # Offsets count from local midnight of the first day, so that working
+    # hours and weekdays are those of settings.TIME_ZONE.
+    base = timezone.localtime(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    groups = []
+    for role, share in REPORT_SHARES.items():
+        authors = [(user.pk, ROLE_LEVELS[role], int((user.created_at - base).total_seconds() // 86400))
+                   for user in users if user.role == role]
+        if authors:
+            groups.append((share, authors))
+    if count and not groups:
+        raise ValueError('No users with a report-writing role to author the reports.')
+    total = sum(share for share, _ in groups)
+    cumulative, acc = [], 0
+    for share, authors in groups:
+        acc += share / total
+        cumulative.append((acc, authors))
+
+    span = (end - base).total_seconds()
+    days = max(int(span // 86400), 1)
+    first_weekday = base.weekday()
+    titles = {level: label.split()[0] for level, label in Report.LEVEL_CHOICES}
+    for n in range(count):
+        pick = rng.random()
+        authors = next((authors for bound, authors in cumulative if pick <= bound), cumulative[-1][1])
+        pk, level, joined_day = authors[int(rng.random() * len(authors))]
+        # a working day after the author joined
+        first = min(joined_day + 1, days - 1)
+        while True:
+            day = first + int(rng.random() * (days - first))
+            if (first_weekday + day) % 7 < 5 or rng.random() < 0.2:
+                break
+        offset = min(day * 86400 + 8 * 3600 + rng.random() * 9 * 3600, span - 1)
+        created = base + timedelta(seconds=offset)
+
+        age_days = (span - offset) / 86400
+        status = rng.random() < (0.95 if age_days > 30 else 0.3 + 0.65 * age_days / 30)
+        updated = min(created + timedelta(seconds=rng.random() * 5 * 86400), end) if status else created
+        description = f'Synthetic report {n}. {LOREM[:int(150 + rng.random() * (len(LOREM) - 150))]}'
+        yield pk, level, f'{titles[level]} report {n}', description, created, updated, status
+
+
+def bulk_insert_reports(rows, batch_size):
+    """Insert REPORT_COLUMNS tuples with bulk_create; yields the rows written per batch."""
+    fields = [Report._meta.get_field(name) for name in ('created_date', 'updated_at')]
+    with explicit_timestamps(*fields):
+        for batch in batched(rows, batch_size):
+            Report.objects.bulk_create(
+                [Report(**dict(zip(REPORT_COLUMNS, row))) for row in batch], batch_size=batch_size)
+            yield len(batch)
+
+
+def copy_reports(rows, batch_size):
+    """Stream REPORT_COLUMNS tuples into the report table with COPY (PostgreSQL)."""
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(Report._meta.get_field(name).column) for name in REPORT_COLUMNS)
+    sql = f'COPY {quote(Report._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)'
+    for batch in batched(rows, batch_size):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for pk, level, title, description, created, updated, status in batch:
+            writer.writerow([pk, level, title, description, created.isoformat(), updated.isoformat(),
+                             't' if status else 'f'])
+        with transaction.atomic(), connection.cursor() as cursor:
+            if is_psycopg3:
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            else:
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+        yield len(batch)
+
+
+def analyze():
+    """Refresh planner statistics after a bulk load."""
+    with connection.cursor() as cursor:
+        for model in (CustomUser, Report):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
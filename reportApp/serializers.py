@@ -1,16 +1,24 @@
+from django.db.models import Case, CharField, Value, When
 from rest_framework import serializers
 from .models import Report
 
 from userApp.models import CustomUser
+from RRA_report_backend.fieldsets import SparseFieldsetSerializerMixin
 
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'phone', 'username', 'email']  # Add other fields if needed
 
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     created_by = CustomUserSerializer()  # Nest the CustomUserSerializer
     status_display = serializers.SerializerMethodField()
+    field_sources = {'status_display': ['status']}
+    # get_status_display in SQL, for the fast list path
+    fast_annotations = {
+        'status_display': Case(When(status=True, then=Value('approved')), default=Value('pending'),
+                               output_field=CharField()),
+    }
 
     class Meta:
         model = Report
@@ -0,0 +1,54 @@
+# report/signals.py
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from RRA_report_backend.responsecache import bump_version
+from .models import Report
+from .rollups import bump_report_rollup, rollup_key
+from .search import FTS_TABLE, install_search_index
+
+
+@receiver(pre_save, sender=Report)
+def remember_rollup_key(sender, instance, **kwargs):
+    # Updates can move a report between rollup rows (e.g. approval), so
+    # note where it was counted before the save.
+    instance._previous_rollup_key = None
+    if instance.pk:
+        previous = Report.objects.filter(pk=instance.pk).values_list('created_date', 'level', 'status').first()
+        if previous:
+            instance._previous_rollup_key = rollup_key(*previous)
+
+
+@receiver(post_save, sender=Report)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    key = rollup_key(instance.created_date, instance.level, instance.status)
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous == key:
+        return
+    if previous is not None:
+        bump_report_rollup(*previous, -1)
+    bump_report_rollup(*key, 1)
+
+
+@receiver(post_delete, sender=Report)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    bump_report_rollup(*rollup_key(instance.created_date, instance.level, instance.status), -1)
+
+
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_version(Report)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # SQLite rebuilds a table (dropping its triggers) for many schema
+    # changes, so put the full-text sync triggers back after migrating.
+    if sender.name != 'reportApp':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        with connection.schema_editor() as schema_editor:
+            install_search_index(schema_editor, rebuild=False)
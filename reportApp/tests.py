@@ -1,3 +1,972 @@
-from django.test import TestCase
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from RRA_report_backend.fastread import ReadPlan
+from RRA_report_backend.responsecache import response_cache, single_flight
+from RRA_report_backend.queryplans import capture_selects, plan_problems
+from RRA_report_backend.stats import bucket_counts, parse_series_params
+from userApp.lookup import identifier_cache
+from userApp.models import CustomUser
+from userApp.outbox import drain, enqueue
+from .benchmarks import ENDPOINTS, bench_endpoints, compare_results, missing_endpoints, report_cursor_url
+from .models import Report, ReportDailyStat
+from .rollups import rebuild_report_rollups
+from .serializers import ReportSerializer
+from .seed import explicit_timestamps, seed_reports, seed_users
+
+
+class ReportQueryBudgetTests(TestCase):
+    """
+    Every report read path must run a constant number of queries, however
+    many rows it returns. The budgets below are checked at 10, 1,000 and
+    10,000 reports.
+    """
+    sizes = [10, 1000, 10000]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.users = seed_users(20, created_by=cls.admin)
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def budgets(self):
+        user = self.users[0]
+        report = Report.objects.first()
+        return [
+            # conditional GET validators: +2 on the list and all-report
+            # exports, +1 on single-report views
+            (reverse('report-list'), 3),
+            (reverse('report-list') + '?page_size=500', 3),
+            (reverse('report-by-level', args=['unit']), 1),
+            (reverse('report-by-title', args=['Report']), 1),
+            (reverse('report-search') + '?q=synthetic+report', 2),
+            (reverse('report-by-user', args=[user.username]), 2),
+            (reverse('reports-by-creator', args=[user.id]), 1),
+            (reverse('reports-by-subordinates', args=[self.admin.id]), 1),
+            (reverse('reports-by-subordinates', args=[self.admin.id]) + '?depth=1', 1),
+            (reverse('reports-by-subordinates-summary', args=[self.admin.id]), 2),
+            (reverse('report-detail', args=[report.id]), 2),
+            (reverse('report-count'), 1),
+            (reverse('report-trend'), 1),
+            (reverse('report-trend') + '?bucket=month', 1),
+            (reverse('report-download-pdf', args=[report.id]), 2),
+            (reverse('report-download-excel', args=[report.id]), 2),
+            (reverse('report-download-all-pdf'), 4),
+            (reverse('report-download-all-excel'), 4),
+        ]
+
+    def test_query_budget_is_independent_of_row_count(self):
+        seeded = 0
+        for size in self.sizes:
+            seed_reports(size - seeded, self.users, seed=size)
+            seeded = size
+            for url, budget in self.budgets():
+                identifier_cache.clear()
+                with self.subTest(rows=size, url=url):
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+class ReportExcelExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(25, [cls.admin])
+
+    def test_all_reports_workbook_is_streamed(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('report-download-all-excel'))
+
+        self.assertTrue(response.streaming)
+        self.assertIn('all_reports.xls', response['Content-Disposition'])
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(ws.values)
+        self.assertEqual(rows[0], ("ID", "Created By", "Level", "Title", "Description", "Created Date"))
+        self.assertEqual(len(rows), 26)
+        self.assertEqual({row[1] for row in rows[1:]}, {self.admin.username})
+
+
+class ReportPDFExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(300, [cls.admin])
+        # Longer than a whole page: it has to be split across pages.
+        Report.objects.filter(pk=Report.objects.first().pk).update(description='A long line of text. ' * 3000)
+
+    def test_all_reports_pdf_spans_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('report-download-all-pdf'))
+
+        self.assertTrue(response.streaming)
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertGreater(pdf.count(b'/Type /Page\n'), 10)
+
+
+class ReportTrendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        noon = timezone.make_aware(datetime.combine(timezone.localdate(), time(12)))
+        created_date = Report._meta.get_field('created_date')
+        with explicit_timestamps(created_date):
+            Report.objects.bulk_create([
+                Report(created_by=cls.admin, level='unit', title=f'Report {days}', description='',
+                       created_date=noon - timedelta(days=days))
+                for days in [0, 0, 3, 20, 200, 2000]
+            ])
+        rebuild_report_rollups()
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_trend_windows(self):
+        response = self.client.get(reverse('report-trend'))
+        self.assertEqual(response.data, {
+            "daily": 2, "weekly": 3, "monthly": 4, "three_months": 4, "six_months": 4,
+            "yearly": 5, "three_years": 5, "five_years": 5, "ten_years": 6,
+        })
+
+    def test_bucketed_series(self):
+        today = timezone.localdate()
+        params = {
+            'bucket': 'day',
+            'from': (today - timedelta(days=30)).isoformat(),
+            'to': today.isoformat(),
+        }
+        response = self.client.get(reverse('report-trend'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['count'] for row in response.data['series']], [1, 1, 2])
+        self.assertEqual(response.data['series'][-1]['date'], today.isoformat())
+
+        bucket, start, end = parse_series_params(params)
+        self.assertEqual(response.data['series'], bucket_counts(Report.objects.all(), 'created_date', bucket, start, end))
+
+    def test_series_with_mid_day_bound(self):
+        # Rollups are per day: a `to` within a day counts that whole day.
+        today = timezone.localdate()
+        for to, expected in [(f'{today}T23:59:59', [1, 1, 2]), (f'{today}T00:00:00', [1, 1])]:
+            params = {'bucket': 'day', 'from': (today - timedelta(days=30)).isoformat(), 'to': to}
+            with self.subTest(to=to):
+                response = self.client.get(reverse('report-trend'), params)
+                self.assertEqual([row['count'] for row in response.data['series']], expected)
+
+    def test_count(self):
+        self.assertEqual(self.client.get(reverse('report-count')).data, {"count": 6})
+
+    def test_invalid_series_parameters(self):
+        self.assertEqual(self.client.get(reverse('report-trend'), {'bucket': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('report-trend'), {'bucket': 'day', 'from': 'soon'}).status_code, 400)
+
+
+class ReportRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+
+    def counts(self):
+        totals = ReportDailyStat.objects.values('level', 'status').annotate(n=Sum('count')).filter(n__gt=0)
+        return {(row['level'], row['status']): row['n'] for row in totals}
+
+    def test_signals_keep_rollups_current(self):
+        first = Report.objects.create(created_by=self.admin, level='unit', title='a', description='')
+        Report.objects.create(created_by=self.admin, level='unit', title='b', description='')
+        self.assertEqual(self.counts(), {('unit', False): 2})
+
+        first.status = True
+        first.save()
+        first.title = 'renamed'
+        first.save()
+        self.assertEqual(self.counts(), {('unit', False): 1, ('unit', True): 1})
+
+        first.delete()
+        self.assertEqual(self.counts(), {('unit', False): 1})
+
+    def test_rebuild_repairs_rollups(self):
+        seed_reports(500, [self.admin])
+        ReportDailyStat.objects.update(count=0)
+        call_command('rebuild_rollups', batch_days=7, stdout=StringIO())
+        expected = Report.objects.values('level', 'status').annotate(n=Count('pk'))
+        self.assertEqual(self.counts(), {(row['level'], row['status']): row['n'] for row in expected})
+
+
+class ReportSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        create = Report.objects.create
+        cls.budget = create(created_by=cls.admin, level='unit', title='Budget review',
+                            description='Quarterly budget figures for the budget committee.')
+        cls.audit = create(created_by=cls.admin, level='division', title='Tax audit', status=True,
+                           description='Audit findings, including a budget overrun.')
+        create(created_by=cls.admin, level='unit', title='Staff training', description='Training schedule.')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def search(self, **params):
+        response = self.client.get(reverse('report-search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search(q='budget'), [self.budget.id, self.audit.id])
+        self.assertEqual(self.search(q='audit budg'), [self.audit.id])
+
+    def test_filters(self):
+        self.assertEqual(self.search(q='budget', level='division'), [self.audit.id])
+        self.assertEqual(self.search(q='budget', status='pending'), [self.budget.id])
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.search(q='budget', **{'from': tomorrow}), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.budget.title = 'Spending review'
+        self.budget.description = 'Quarterly figures.'
+        self.budget.save()
+        self.assertEqual(self.search(q='budget'), [self.audit.id])
+        self.assertEqual(self.search(q='spending'), [self.budget.id])
+        self.audit.delete()
+        self.assertEqual(self.search(q='budget'), [])
+
+    def test_operators_are_treated_as_text(self):
+        self.assertEqual(self.search(q='"budget OR (NEAR'), [])
+        self.assertEqual(self.client.get(reverse('report-search')).status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ReportQueryPlanTests(TestCase):
+    """
+    Report endpoints must reach reports and users through an index rather
+    than a full scan or an unindexed sort. Not checked: by_title (icontains
+    cannot use a btree index; /search/ is the indexed alternative) and the
+    whole-table exports.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.users = seed_users(200, created_by=cls.admin)
+        seed_reports(20000, cls.users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        identifier_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_endpoints_use_indexes(self):
+        tables = {Report._meta.db_table, CustomUser._meta.db_table}
+        user = self.users[0]
+        report = Report.objects.first()
+        # (url, whether sorting the matched rows is acceptable)
+        urls = [
+            (reverse('report-list'), False),
+            (report_cursor_url(15000), False),
+            (reverse('report-by-level', args=['unit']), False),
+            (reverse('report-by-user', args=[user.username]), False),
+            (reverse('report-by-user', args=[user.email]), False),
+            (reverse('report-by-user', args=[user.phone]), False),
+            # relevance order can only come from sorting the matches
+            (reverse('report-search') + '?q=report&status=pending', True),
+            (reverse('reports-by-creator', args=[user.id]), False),
+            # rows from many creators' index ranges have to be merged by a sort
+            (reverse('reports-by-subordinates', args=[self.admin.id]), True),
+            (reverse('reports-by-subordinates-summary', args=[self.admin.id]), False),
+            (reverse('report-detail', args=[report.id]), False),
+            (reverse('report-count'), False),
+            (reverse('report-trend'), False),
+            (reverse('report-trend') + '?bucket=week', False),
+            (reverse('report-download-pdf', args=[report.id]), False),
+        ]
+        for url, allow_sort in urls:
+            with self.subTest(url=url):
+                with capture_selects() as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                problems = [problem for sql, params in queries
+                            for problem in plan_problems(sql, params, tables, allow_sort)]
+                self.assertEqual(problems, [])
+
+
+class ReportByUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.users = seed_users(3)
+        seed_reports(30, cls.users)
+
+    def setUp(self):
+        identifier_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, identifier):
+        response = self.client.get(reverse('report-by-user', args=[identifier]))
+        self.assertEqual(response.status_code, 200)
+        return {row['created_by']['id'] for row in response.data['results']}
+
+    def test_resolves_username_email_and_phone(self):
+        user = self.users[0]
+        for identifier in (user.username, user.email, user.phone):
+            self.assertEqual(self.ids(identifier), {user.id})
+        self.assertEqual(self.ids('nobody'), set())
+
+    def test_numeric_username_falls_back_to_full_match(self):
+        user = self.users[1]
+        user.username = '0123'
+        user.save()
+        self.assertEqual(self.ids('0123'), {user.id})
+
+    def test_cached_lookup_and_invalidation(self):
+        user = self.users[2]
+        self.ids(user.username)
+        with self.assertNumQueries(1):
+            self.ids(user.username)
+
+        old_username = user.username
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.ids(old_username), set())
+        self.assertEqual(self.ids('renamed'), {user.id})
+
+
+class ReportsBySubordinatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # admin -> division head -> department head -> unit users
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.division = seed_users(1, role='head of division', created_by=cls.admin)[0]
+        cls.department = seed_users(1, role='head of department', created_by=cls.division)[0]
+        cls.units = seed_users(2, created_by=cls.department)
+        for user, count in [(cls.division, 1), (cls.department, 2), (cls.units[0], 3), (cls.units[1], 4)]:
+            seed_reports(count, [user], seed=count)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def creators(self, user, **params):
+        response = self.client.get(reverse('reports-by-subordinates', args=[user.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['created_by']['id'] for row in response.data['results'])
+
+    def test_whole_subtree(self):
+        units = sorted([self.units[0].id] * 3 + [self.units[1].id] * 4)
+        self.assertEqual(self.creators(self.admin), sorted([self.division.id] + [self.department.id] * 2 + units))
+        self.assertEqual(self.creators(self.department), units)
+        self.assertEqual(self.creators(self.units[0]), [])
+
+    def test_depth_limit(self):
+        self.assertEqual(self.creators(self.admin, depth=1), [self.division.id])
+        self.assertEqual(self.creators(self.admin, depth=2), [self.division.id] + [self.department.id] * 2)
+        response = self.client.get(reverse('reports-by-subordinates', args=[self.admin.id]), {'depth': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_created_by_cycle_terminates(self):
+        CustomUser.objects.filter(pk=self.admin.pk).update(created_by=self.units[0])
+        self.assertEqual(len(self.creators(self.division)), 10)
+
+    def test_summary(self):
+        response = self.client.get(reverse('reports-by-subordinates-summary', args=[self.division.id]))
+        self.assertEqual(response.data['users'], 3)
+        self.assertEqual(response.data['reports'], 9)
+        self.assertEqual(response.data['approved'] + response.data['pending'], 9)
+        self.assertEqual(sum(response.data[level] for level in ('unit', 'department', 'division')), 9)
+        response = self.client.get(reverse('reports-by-subordinates-summary', args=[self.division.id]), {'depth': 1})
+        self.assertEqual((response.data['users'], response.data['reports']), (1, 2))
+
+
+class ReportBatchUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.head = seed_users(1, role='head of division', created_by=cls.admin)[0]
+        cls.units = seed_users(3, created_by=cls.head)
+        seed_reports(300, [cls.admin, *cls.units])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, name, body):
+        return self.client.post(reverse(name), body, format='json')
+
+    def assertRollupsCurrent(self):
+        def rollups():
+            return set(ReportDailyStat.objects.filter(count__gt=0).values_list('date', 'level', 'status', 'count'))
+        current = rollups()
+        rebuild_report_rollups()
+        self.assertEqual(current, rollups())
+
+    def test_approve_ids(self):
+        pending = list(Report.objects.filter(status=False).values_list('id', flat=True)[:50])
+        approved = list(Report.objects.filter(status=True).values_list('id', flat=True)[:5])
+        response = self.post('report-batch-approve', {'ids': pending + approved})
+        self.assertEqual(response.data, {'matched': 55, 'updated': 50, 'dry_run': False})
+        self.assertEqual(Report.objects.filter(pk__in=pending, status=True).count(), 50)
+        self.assertRollupsCurrent()
+
+    def test_dry_run_changes_nothing(self):
+        pending = Report.objects.filter(status=False).count()
+        with self.assertNumQueries(2):
+            response = self.post('report-batch-approve', {'status': 'pending', 'dry_run': True})
+        self.assertEqual(response.data, {'matched': pending, 'updated': pending, 'dry_run': True})
+        self.assertEqual(Report.objects.filter(status=False).count(), pending)
+
+    def test_update_by_filters(self):
+        subtree = Report.objects.filter(created_by__in=self.units, level='unit')
+        expected = subtree.exclude(status=False).count()
+        response = self.post('report-batch-update', {
+            'subtree': self.admin.id, 'level': 'unit', 'set': {'status': False},
+        })
+        self.assertEqual((response.data['matched'], response.data['updated']), (subtree.count(), expected))
+        self.assertFalse(subtree.filter(status=True).exists())
+        self.assertTrue(Report.objects.filter(created_by=self.admin, level='unit', status=True).exists())
+
+        reports = Report.objects.filter(created_by=self.units[0])
+        expected = reports.exclude(level='division', status=True).count()
+        response = self.post('report-batch-update', {
+            'created_by': self.units[0].id, 'to': timezone.localdate().isoformat(),
+            'set': {'level': 'division', 'status': True},
+        })
+        self.assertEqual((response.data['matched'], response.data['updated']), (reports.count(), expected))
+        self.assertRollupsCurrent()
+
+    def test_query_count_is_independent_of_batch_size(self):
+        pending = list(Report.objects.filter(status=False).values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as small:
+            self.post('report-batch-approve', {'ids': pending[:2]})
+        with CaptureQueriesContext(connection) as large:
+            self.post('report-batch-approve', {'ids': pending[2:]})
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_requests(self):
+        for body in [
+            {},
+            {'ids': []},
+            {'ids': ['1']},
+            {'ids': [1], 'level': 'unit'},
+            {'level': 'galaxy'},
+            {'subtree': 'x'},
+            {'from': 'yesterday'},
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(self.post('report-batch-approve', body).status_code, 400)
+        for changes in [None, {}, {'status': 'yes'}, {'level': 'galaxy'}, {'title': 'x'}]:
+            with self.subTest(changes=changes):
+                self.assertEqual(self.post('report-batch-update', {'level': 'unit', 'set': changes}).status_code, 400)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(20, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_hits_skip_the_database(self):
+        # the list still runs its two conditional GET validator queries
+        for name, queries in (('report-count', 0), ('report-trend', 0), ('report-list', 2)):
+            with self.subTest(name=name):
+                first = self.get(name)
+                with self.assertNumQueries(queries):
+                    self.assertEqual(self.get(name), first)
+        self.assertNotEqual(self.get('report-trend', bucket='month'), self.get('report-trend'))
+
+    def test_writes_invalidate(self):
+        self.assertEqual(self.get('report-count')['count'], 20)
+        report = Report.objects.create(created_by=self.admin, level='unit', title='new', description='')
+        self.assertEqual(self.get('report-count')['count'], 21)
+
+        self.assertEqual(self.get('report-list')['results'][0]['status'], False)
+        self.client.post(reverse('report-batch-approve'), {'ids': [report.id]}, format='json')
+        self.assertEqual(self.get('report-list')['results'][0]['status'], True)
+
+        self.admin.username = 'renamed'
+        self.admin.save()
+        self.assertEqual(self.get('report-list')['results'][0]['created_by']['username'], 'renamed')
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get(reverse('report-trend'), {'bucket': 'year'}).status_code, 400)
+        self.assertEqual(len(response_cache()._cache), 1)  # just the Report version counter
+
+    def test_single_flight(self):
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time_module.sleep(0.2)
+            response_cache().set('flight', 'value')
+            return 'value'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight('flight', compute)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(single_flight('flight', compute)))
+                     for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+
+class ReportConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(30, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_list(self):
+        url = reverse('report-list')
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(2):
+            cached = self.revalidate(url, first)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        # another page is another representation
+        self.assertEqual(self.revalidate(url + '?page_size=5', first).status_code, 200)
+
+        report = Report.objects.latest('created_date')
+        report.title = 'changed'
+        report.save()
+        changed = self.revalidate(url, first)
+        self.assertEqual(changed.status_code, 200)
+
+        # creators are embedded in every row
+        self.admin.email = 'renamed@gmail.com'
+        self.admin.save()
+        self.assertEqual(self.revalidate(url, changed).status_code, 200)
+
+    def test_batch_update_changes_the_tag(self):
+        url = reverse('report-list')
+        first = self.client.get(url)
+        pending = Report.objects.filter(status=False).values_list('id', flat=True)[:1]
+        self.client.post(reverse('report-batch-approve'), {'ids': list(pending)}, format='json')
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_sparse_detail_is_another_representation(self):
+        url = reverse('report-detail', args=[Report.objects.first().id])
+        full = self.client.get(url)
+        sparse = self.client.get(url + '?fields=id')
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+        self.assertEqual(self.revalidate(url + '?fields=id', full).status_code, 200)
+        self.assertEqual(self.revalidate(url + '?fields=id', sparse).status_code, 304)
+
+    def test_detail_and_exports(self):
+        report = Report.objects.first()
+        for url in [
+            reverse('report-detail', args=[report.id]),
+            reverse('report-download-pdf', args=[report.id]),
+            reverse('report-download-all-excel'),
+        ]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+                report.save()
+                self.assertEqual(self.revalidate(url, first).status_code, 200)
+        self.assertEqual(self.client.get(reverse('report-detail', args=[0])).status_code, 404)
+
+
+class ReportSparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(15, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def report_select(self, queries):
+        table = Report._meta.db_table
+        return next(query['sql'] for query in queries
+                    if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+                    and 'MAX(' not in query['sql'])
+
+    def test_fields_limit_output_and_columns(self):
+        url = reverse('report-list') + '?fields=id,title,level,status,status_display,created_date&page_size=5'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual(list(row), ['id', 'level', 'title', 'created_date', 'status', 'status_display'])
+        sql = self.report_select(queries.captured_queries)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('JOIN', sql)
+
+        # the cursor still works on the projected rows
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(list(next_page.data['results'][0]), list(row))
+
+    def test_expand_creator(self):
+        report = Report.objects.first()
+        url = reverse('report-detail', args=[report.id]) + '?fields=id,title&expand=created_by'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.data, {
+            'id': report.id,
+            'created_by': {'id': self.admin.id, 'phone': self.admin.phone,
+                           'username': self.admin.username, 'email': self.admin.email},
+            'title': report.title,
+        })
+        sql = self.report_select(queries.captured_queries)
+        self.assertIn('JOIN', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"password"', sql)
+
+    def test_default_and_writes_are_unchanged(self):
+        full = self.client.get(reverse('report-list')).data['results'][0]
+        self.assertIn('description', full)
+        self.assertIn('created_by', full)
+
+        report = Report.objects.first()
+        response = self.client.put(reverse('report-approve', args=[report.id]) + '?fields=id', {}, format='json')
+        self.assertIn('description', response.data)
+
+    def test_unknown_names(self):
+        for query in ['?fields=id,secret', '?fields=id&expand=title', '?expand=nope']:
+            with self.subTest(query=query):
+                with self.assertLogs('django.request', 'WARNING'):
+                    response = self.client.get(reverse('report-list') + query)
+                self.assertEqual(response.status_code, 400)
+
+
+class ReportFastReadTests(TestCase):
+    """The values() list path must render exactly what ReportSerializer does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.users = seed_users(5, created_by=cls.admin)
+        seed_reports(40, cls.users)
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_output_matches_serializer(self):
+        user = self.users[0]
+        self.assertIsNotNone(ReadPlan.for_serializer(ReportSerializer()))
+        self.assertEqual(set(Report.objects.values_list('status', flat=True)), {True, False})
+        for url in [
+            reverse('report-list') + '?page_size=500',
+            reverse('report-list') + '?page_size=7',
+            reverse('report-list') + '?fields=id,status_display,created_date&expand=created_by',
+            reverse('report-by-level', args=['unit']),
+            reverse('report-by-title', args=['Report']),
+            reverse('report-search') + '?q=synthetic+report',
+            reverse('report-by-user', args=[user.username]),
+            reverse('reports-by-creator', args=[user.id]),
+            reverse('reports-by-subordinates', args=[self.admin.id]),
+            reverse('report-by-title', args=['no such title']),
+        ]:
+            with self.subTest(url=url):
+                fast = self.client.get(url)
+                response_cache().clear()
+                with override_settings(FAST_READS=False):
+                    slow = self.client.get(url)
+                response_cache().clear()
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+                if 'no%20such' not in url:
+                    self.assertTrue(fast.data['results'])
+
+    def test_cursor_pages(self):
+        url = reverse('report-list') + '?page_size=15'
+        seen = []
+        while url:
+            page = self.client.get(url).data
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, list(Report.objects.order_by('-created_date', '-id').values_list('id', flat=True)))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EndpointBenchmarkTests(TestCase):
+    def test_every_url_has_a_request(self):
+        self.assertEqual(missing_endpoints(), [])
+
+    def test_suite_runs_every_endpoint(self):
+        results = bench_endpoints([30], 1)
+        self.assertEqual([row['endpoint'] for row in results], list(ENDPOINTS))
+        for row in results:
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertEqual({row['endpoint']: row['queries'] for row in results}['report-list'], 3)
+
+    def test_compare_results(self):
+        baseline = [{'reports': 10, 'endpoint': 'a', 'p50_ms': 10.0, 'p90_ms': 10.0, 'p99_ms': 10.0,
+                     'queries': 2, 'peak_kb': 100}]
+        current = [{**baseline[0], 'p50_ms': 12.5, 'queries': 3},
+                   {**baseline[0], 'endpoint': 'b'}]
+        comparisons = compare_results('endpoints', baseline, current, 0.2)
+        regressed = {c['metric'] for c in comparisons if c['regression']}
+        self.assertEqual(regressed, {'p50_ms', 'queries'})
+        self.assertTrue(all(c['change'] is None for c in comparisons if c['key'] == (10, 'b')))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GenerateDataTests(TestCase):
+    def test_org_tree_and_reports(self):
+        out = StringIO()
+        call_command('generate_data', users=110, reports=2000, days=120, batch_size=300, force=True, stdout=out)
+        self.assertIn('Generated 111 users and 2000 reports', out.getvalue())
+
+        admin = CustomUser.objects.get(role='admin')
+        self.assertTrue(admin.is_admin)
+        parents = {'head of division': 'admin', 'head of department': 'head of division',
+                   'unit user': 'head of department'}
+        for user in CustomUser.objects.exclude(pk=admin.pk).select_related('created_by'):
+            self.assertEqual(user.created_by.role, parents[user.role])
+            self.assertGreaterEqual(user.created_at, user.created_by.created_at)
+        self.assertTrue(CustomUser.objects.filter(role='unit user').first().check_password('password'))
+
+        levels = {'head of division': 'division', 'head of department': 'department', 'unit user': 'unit'}
+        reports = Report.objects.select_related('created_by')
+        self.assertEqual(reports.count(), 2000)
+        for report in reports:
+            self.assertEqual(report.level, levels[report.created_by.role])
+            self.assertGreater(report.created_date, report.created_by.created_at)
+            self.assertGreaterEqual(report.updated_at, report.created_date)
+        # The rollups were rebuilt after the bulk load.
+        self.assertEqual(ReportDailyStat.objects.aggregate(n=Sum('count'))['n'], 2000)
+
+    def test_refuses_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_data', users=1, reports=1, stdout=StringIO())
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(10, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def timings(self, response):
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_header(self):
+        response = self.client.get(reverse('report-list'))
+        timings = self.timings(response)
+        self.assertEqual(timings['total']['desc'], '"report-list"')
+        self.assertEqual(timings['db']['desc'], '"3 queries"')
+        self.assertEqual(set(timings), {'total', 'db', 'view', 'render'})
+        self.assertGreaterEqual(float(timings['total']['dur']), float(timings['render']['dur']))
+
+        # streaming exports have no render step
+        timings = self.timings(self.client.get(reverse('report-download-all-excel')))
+        self.assertNotIn('render', timings)
+
+    @override_settings(SLOW_REQUEST_QUERIES=3)
+    def test_slow_request_log(self):
+        with self.assertLogs('RRA_report_backend.timing', 'WARNING') as logs:
+            self.client.get(reverse('report-list'))
+        record = logs.records[0].request_timing
+        self.assertEqual((record['view'], record['status'], record['queries']), ('report-list', 200, 3))
+
+        with self.assertNoLogs('RRA_report_backend.timing', 'WARNING'):
+            self.client.get(reverse('report-count'))
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_hidden(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('report-count')))
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_reports(10, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def scrape(self, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer scrape-secret')
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                series, value = line.rsplit(' ', 1)
+                samples[series] = float(value)
+        return samples
+
+    def test_request_metrics(self):
+        requests = 'http_requests_total{view="report-list",method="GET",status="200"}'
+        before = self.scrape().get(requests, 0)
+        self.client.get(reverse('report-list'))
+        self.client.get(reverse('report-list'))
+        samples = self.scrape()
+        self.assertEqual(samples[requests], before + 2)
+
+        count = samples['http_request_duration_seconds_count{view="report-list"}']
+        self.assertEqual(samples['http_request_duration_seconds_bucket{view="report-list",le="+Inf"}'], count)
+        self.assertLessEqual(samples['http_request_duration_seconds_bucket{view="report-list",le="0.005"}'], count)
+        # three queries per report list page, two when served from the cache
+        self.assertEqual(samples['http_request_queries_bucket{view="report-list",le="1"}'], 0)
+        self.assertEqual(samples['http_request_queries_bucket{view="report-list",le="3"}'], count)
+
+    def test_export_metrics(self):
+        series = 'export_size_bytes_count{source="download",format="xlsx"}'
+        before = self.scrape().get(series, 0)
+        response = self.client.get(reverse('report-download-all-excel'))
+        size = len(b''.join(response.streaming_content))
+        samples = self.scrape()
+        self.assertEqual(samples[series], before + 1)
+        self.assertGreaterEqual(samples['export_size_bytes_sum{source="download",format="xlsx"}'], size)
+
+    def test_processes_are_summed_through_the_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = [['http_requests_total', ['report-count', 'GET', '200'], 5]]
+            with open(os.path.join(directory, 'other-worker.json'), 'w') as f:
+                json.dump(other, f)
+            series = 'http_requests_total{view="report-count",method="GET",status="200"}'
+            before = self.scrape()[series]
+            self.client.get(reverse('report-count'))
+            self.assertEqual(self.scrape()[series], before + 1)
+            self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.json')]), 2)
+
+    def test_email_metrics(self):
+        before = self.scrape().get('emails_total{result="sent"}', 0)
+        enqueue('Subject', 'Body', 'from@example.com', ['to@gmail.com'])
+        drain()
+        samples = self.scrape()
+        self.assertEqual(samples['emails_total{result="sent"}'], before + 1)
+        self.assertGreaterEqual(samples['email_send_duration_seconds_count'], 1)
+
+    def test_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+    @override_settings(METRICS_TOKEN='')
+    def test_closed_without_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.admin.is_admin = True
+        cls.admin.save()
+        cls.unit = seed_users(1)[0]
+        seed_reports(10, [cls.admin])
+
+    def setUp(self):
+        response_cache().clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILING_DIR=directory.name, PROFILER='cprofile')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_admin_profiles_a_request(self):
+        self.login(self.admin)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('report-list')))
+        response = self.client.get(reverse('report-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        [profile] = self.client.get(reverse('profile-list')).data
+        self.assertEqual((profile['id'], profile['view'], profile['status']), (profile_id, 'report-list', 200))
+        download = self.client.get(reverse('profile-download', args=[profile_id]))
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b''.join(download.streaming_content))
+            f.flush()
+            self.assertTrue(pstats.Stats(f.name).total_calls)
+
+    def test_only_admins(self):
+        self.login(self.unit)
+        response = self.client.get(reverse('report-list') + '?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('profile-list')).status_code, 403)
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_ring_buffer(self):
+        self.login(self.admin)
+        ids = [self.client.get(reverse('report-count') + '?_profile=1')['X-Profile-Id'] for _ in range(3)]
+        listed = [profile['id'] for profile in self.client.get(reverse('profile-list')).data]
+        self.assertEqual(listed, ids[:0:-1])
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('profile-download', args=[ids[0]])).status_code, 404)
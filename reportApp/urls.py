@@ -9,6 +9,7 @@ from .views import (
     ReportByIdView,
     ReportByTitleView,
     ReportByUserView,
+    ReportSearchView,
     ReportCountView,
     ReportTrendView,
     ReportDownloadPDFView,
@@ -17,18 +18,23 @@ from .views import (
     ReportDownloadAllExcelView,
     ReportsByCreatorView,
     ReportsBySubordinatesView,
-    ReportApproveView  # New
+    ReportsBySubordinatesSummaryView,
+    ReportApproveView,  # New
+    ReportBatchApproveView,
+    ReportBatchUpdateView,
 )
 
 urlpatterns = [
     path('create/', ReportCreateView.as_view(), name='report-create'),
     path('update/<int:pk>/', ReportUpdateView.as_view(), name='report-update'),
+    path('update/batch/', ReportBatchUpdateView.as_view(), name='report-batch-update'),
     path('delete/<int:pk>/', ReportDeleteView.as_view(), name='report-delete'),
     path('reports/', ReportListView.as_view(), name='report-list'),
     path('by_level/<str:level>/', ReportByLevelView.as_view(), name='report-by-level'),
     path('report/<int:pk>/', ReportByIdView.as_view(), name='report-detail'),
     path('by_title/<str:title>/', ReportByTitleView.as_view(), name='report-by-title'),
     path('by_user/<str:user>/', ReportByUserView.as_view(), name='report-by-user'),
+    path('search/', ReportSearchView.as_view(), name='report-search'),
     path('count/', ReportCountView.as_view(), name='report-count'),
     path('trend/', ReportTrendView.as_view(), name='report-trend'),
     path('download/pdf/<int:pk>/', ReportDownloadPDFView.as_view(), name='report-download-pdf'),
@@ -37,5 +43,7 @@ urlpatterns = [
     path('download/all/excel/', ReportDownloadAllExcelView.as_view(), name='report-download-all-excel'),
     path('reports/by_creator/<int:user_id>/', ReportsByCreatorView.as_view(), name='reports-by-creator'),
     path('reports/by_subordinates/<int:creator_id>/', ReportsBySubordinatesView.as_view(), name='reports-by-subordinates'),
+    path('reports/by_subordinates/<int:creator_id>/summary/', ReportsBySubordinatesSummaryView.as_view(), name='reports-by-subordinates-summary'),
     path('approve/<int:pk>/', ReportApproveView.as_view(), name='report-approve'),  # New
+    path('approve/batch/', ReportBatchApproveView.as_view(), name='report-batch-approve'),
 ]
@@ -1,10 +1,41 @@
-from datetime import timedelta, timezone
+from datetime import timedelta
+from django.db.models import Count, Q
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Report
+from .batch import batch_changes, batch_selection, batch_update
+from .models import Report, ReportDailyStat
+from .pagination import CreatedDateCursorPagination, SearchPagination
+from .search import search_reports
 from .serializers import ReportSerializer, ReportUpdateSerializers
+from userApp.hierarchy import subtree_user_ids
+from userApp.lookup import resolve_user_id
 from userApp.models import CustomUser
+from RRA_report_backend.conditional import collection_state, conditional_get, make_etag, newest
+from RRA_report_backend.fastread import FastReadMixin
+from RRA_report_backend.fieldsets import SparseFieldsetMixin
+from RRA_report_backend.responsecache import cached_get
+from RRA_report_backend.stats import parse_bound, rollup_bucket_counts, rollup_total, rollup_window_counts, series
+
+
+def report_list_state(view, request, *args, **kwargs):
+    # The URL carries the cursor and page size, so it is part of the tag;
+    # creators are embedded in every row, so their changes count too.
+    return collection_state(Report.objects.all(), request.get_full_path(), related=[CustomUser])
+
+
+def report_export_state(view, request, *args, **kwargs):
+    return collection_state(Report.objects.all(), type(view).__name__, related=[CustomUser])
+
+
+def report_state(view, request, *args, **kwargs):
+    row = Report.objects.filter(pk=kwargs['pk']).values_list('updated_at', 'created_by__updated_at').first()
+    if row is None:
+        return None
+    # ?fields= and ?expand= shape the body, so they are part of the tag.
+    return (make_etag('report', kwargs['pk'], *row, type(view).__name__,
+                      request.GET.get('fields'), request.GET.get('expand')), newest(*row))
 
 
 class ReportCreateView(generics.CreateAPIView):
@@ -51,102 +82,134 @@ class ReportDeleteView(generics.DestroyAPIView):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
 
-class ReportListView(generics.ListAPIView):
-    queryset = Report.objects.all()
+class ReportListView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
+    queryset = Report.objects.select_related('created_by')
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
 
-    def get_queryset(self):
-        reports = super().get_queryset()
-        for report in reports:
-            if report.status == False:
-                report.status_display = 'pending'
-            if report.status == True:
-                report.status_display = 'approved'
-        return reports
+    @conditional_get(report_list_state)
+    @cached_get(models=[Report, CustomUser], ttl='list')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
-class ReportByLevelView(generics.ListAPIView):
+
+class ReportByLevelView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
 
     def get_queryset(self):
         level = self.kwargs['level']
-        reports = Report.objects.filter(level=level)
-        for report in reports:
-            if report.status == False:
-                report.status_display = 'pending'
-            else:
-                report.status_display = 'approved'
+        reports = Report.objects.filter(level=level).select_related('created_by')
         return reports
 
-class ReportByIdView(generics.RetrieveAPIView):
-    queryset = Report.objects.all()
+class ReportByIdView(SparseFieldsetMixin, generics.RetrieveAPIView):
+    queryset = Report.objects.select_related('created_by')
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
 
-class ReportByTitleView(generics.ListAPIView):
+    @conditional_get(report_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class ReportByTitleView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
 
     def get_queryset(self):
         title = self.kwargs['title']
-        reports = Report.objects.filter(title__icontains=title)
-        for report in reports:
-            if report.status == False:
-                report.status_display = 'pending'
-            else:
-                report.status_display = 'approved'
+        reports = Report.objects.filter(title__icontains=title).select_related('created_by')
         return reports
 
 
 
-class ReportByUserView(generics.ListAPIView):
+class ReportSearchView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Full-text search over titles and descriptions, most relevant first:
+    ?q=<text>&level=&status=approved|pending&from=&to=
+    """
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SearchPagination
 
     def get_queryset(self):
-        user = self.kwargs['user']
-        reports = Report.objects.filter(created_by__username=user) | \
-                  Report.objects.filter(created_by__email=user) | \
-                  Report.objects.filter(created_by__phone=user)
-        for report in reports:
-            if report.status == False:
-                report.status_display = 'pending'
-            else:
-                report.status_display = 'approved'
-        return reports
+        params = self.request.query_params
+        text = params.get('q', '').strip()
+        if not text:
+            raise ValidationError({"q": "A search query is required."})
+
+        reports = Report.objects.select_related('created_by')
+        if params.get('level'):
+            reports = reports.filter(level=params['level'])
+        if params.get('status'):
+            if params['status'] not in ('approved', 'pending'):
+                raise ValidationError({"status": "Must be 'approved' or 'pending'."})
+            reports = reports.filter(status=params['status'] == 'approved')
+        try:
+            if params.get('from'):
+                reports = reports.filter(created_date__gte=parse_bound(params['from']))
+            if params.get('to'):
+                reports = reports.filter(created_date__lt=parse_bound(params['to'], end=True))
+        except ValueError as e:
+            raise ValidationError({"error": str(e)})
+        return search_reports(text, reports)
+
+class ReportByUserView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
+    serializer_class = ReportSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
+
+    def get_queryset(self):
+        # Resolve the username, email or phone to an id first so the report
+        # query is an indexed equality match on created_by_id.
+        user_id = resolve_user_id(self.kwargs['user'])
+        if user_id is None:
+            return Report.objects.none()
+        return Report.objects.filter(created_by_id=user_id).select_related('created_by')
 
 class ReportCountView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
+    @cached_get(models=[Report], ttl='count')
     def get(self, request):
-        count = Report.objects.count()
+        count = rollup_total(ReportDailyStat.objects.all())
         return Response({"count": count}, status=status.HTTP_200_OK)
 
 class ReportTrendView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get_trend(self, interval):
-        end_date = timezone.now()
-        start_date = end_date - interval
-        return Report.objects.filter(created_date__range=(start_date, end_date)).count()
-
+    windows = {
+        "daily": timedelta(days=1),
+        "weekly": timedelta(weeks=1),
+        "monthly": timedelta(days=30),
+        "three_months": timedelta(days=30*3),
+        "six_months": timedelta(days=30*6),
+        "yearly": timedelta(days=365),
+        "three_years": timedelta(days=365*3),
+        "five_years": timedelta(days=365*5),
+        "ten_years": timedelta(days=365*10),
+    }
+
+    @cached_get(models=[Report], ttl='trend')
     def get(self, request):
-        trends = {
-            "daily": self.get_trend(timedelta(days=1)),
-            "weekly": self.get_trend(timedelta(weeks=1)),
-            "monthly": self.get_trend(timedelta(days=30)),
-            "three_months": self.get_trend(timedelta(days=30*3)),
-            "six_months": self.get_trend(timedelta(days=30*6)),
-            "yearly": self.get_trend(timedelta(days=365)),
-            "three_years": self.get_trend(timedelta(days=365*3)),
-            "five_years": self.get_trend(timedelta(days=365*5)),
-            "ten_years": self.get_trend(timedelta(days=365*10))
-        }
+        # ?bucket=day|week|month&from=&to= returns a histogram instead
+        if 'bucket' in request.query_params:
+            try:
+                data = series(request.query_params, self.bucket_counts)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(data, status=status.HTTP_200_OK)
+
+        trends = rollup_window_counts(ReportDailyStat.objects.all(), self.windows)
         return Response(trends, status=status.HTTP_200_OK)
 
+    def bucket_counts(self, bucket, start, end):
+        return rollup_bucket_counts(ReportDailyStat.objects.all(), bucket, start, end)
+
 class ReportApproveView(generics.UpdateAPIView):
-    queryset = Report.objects.all()
+    queryset = Report.objects.select_related('created_by')
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
 
@@ -158,18 +221,49 @@ class ReportApproveView(generics.UpdateAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class ReportBatchUpdateView(generics.GenericAPIView):
+    """
+    Change the status and/or level of many reports in one UPDATE:
+    {"ids": [...] or filters (level, created_by, subtree, depth, status,
+    from, to), "set": {"status": true, "level": "unit"}, "dry_run": false}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def changes(self, data):
+        return batch_changes(data)
+
+    def post(self, request):
+        data = request.data
+        reports = batch_selection(data)
+        changes = self.changes(data)
+        result = batch_update(reports, changes, dry_run=data.get('dry_run') is True)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class ReportBatchApproveView(ReportBatchUpdateView):
+    """Approve many reports at once; takes the same selection as batch update."""
+
+    def changes(self, data):
+        return {'status': True}
+
 
+
+from io import BytesIO
 from django.http import HttpResponse
+from django.utils.timezone import make_naive
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
+from exportApp.renderers import pdf_response, xlsx_response
+from .exports import report_dataset
 
 
 class ReportDownloadPDFView(generics.GenericAPIView):
+    @conditional_get(report_state)
     def get(self, request, pk):
-        report = Report.objects.get(pk=pk)
+        report = Report.objects.select_related('created_by').get(pk=pk)
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="report_{pk}.pdf"'
 
@@ -199,8 +293,9 @@ class ReportDownloadPDFView(generics.GenericAPIView):
         return response
 
 class ReportDownloadExcelView(generics.GenericAPIView):
+    @conditional_get(report_state)
     def get(self, request, pk):
-        report = Report.objects.get(pk=pk)
+        report = Report.objects.select_related('created_by').get(pk=pk)
         response = HttpResponse(content_type='application/vnd.ms-excel')
         response['Content-Disposition'] = f'attachment; filename="report_{pk}.xls"'
 
@@ -211,7 +306,8 @@ class ReportDownloadExcelView(generics.GenericAPIView):
         headers = ["ID", "Created By", "Level", "Title", "Description", "Created Date"]
         ws.append(headers)
 
-        data = [report.id, report.created_by.username, report.level, report.title, report.description, report.created_date]
+        # Excel cannot store timezone-aware datetimes
+        data = [report.id, report.created_by.username, report.level, report.title, report.description, make_naive(report.created_date)]
         ws.append(data)
 
         for col in ws.columns:
@@ -234,74 +330,18 @@ class ReportDownloadExcelView(generics.GenericAPIView):
         return response
 
 class ReportDownloadAllPDFView(generics.GenericAPIView):
+    @conditional_get(report_export_state)
     def get(self, request):
-        reports = Report.objects.all()
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="all_reports.pdf"'
-
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        headers = ["ID", "Created By", "Level", "Title", "Description", "Created Date"]
-        data = [headers]
-
-        for report in reports:
-            row = [report.id, report.created_by.username, report.level, report.title, report.description, report.created_date]
-            data.append(row)
-
-        table = Table(data)
-        table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                                   ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                                   ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                   ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                                   ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                                   ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                                   ('GRID', (0, 0), (-1, -1), 1, colors.black)]))
-        elements.append(table)
-
-        doc.build(elements)
-        pdf = buffer.getvalue()
-        buffer.close()
-
-        response.write(pdf)
-        return response
+        # Laid out in bounded row chunks with a header on every page,
+        # then streamed back from a temporary file.
+        return pdf_response(report_dataset(), 'all_reports.pdf')
 
 class ReportDownloadAllExcelView(generics.GenericAPIView):
+    @conditional_get(report_export_state)
     def get(self, request):
-        reports = Report.objects.all()
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = 'attachment; filename="all_reports.xls"'
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "All Reports"
-
-        headers = ["ID", "Created By", "Level", "Title", "Description", "Created Date"]
-        ws.append(headers)
-
-        for report in reports:
-            row = [report.id, report.created_by.username, report.level, report.title, report.description, report.created_date]
-            ws.append(row)
-
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column].width = adjusted_width
-            for cell in col:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        buffer = BytesIO()
-        wb.save(buffer)
-        excel_data = buffer.getvalue()
-        buffer.close()
-
-        response.write(excel_data)
-        return response
+        # Rows are streamed from the database into a write-only workbook
+        # and the finished file is streamed back, so memory stays flat.
+        return xlsx_response(report_dataset(), 'all_reports.xls', content_type='application/vnd.ms-excel')
 
 
 '''
@@ -311,25 +351,57 @@ class ReportDownloadAllExcelView(generics.GenericAPIView):
 
 
 
-class ReportsByCreatorView(generics.ListAPIView):
+class ReportsByCreatorView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
-        return Report.objects.filter(created_by=user_id)
+        return Report.objects.filter(created_by=user_id).select_related('created_by')
     
     
     
-class ReportsBySubordinatesView(generics.ListAPIView):
+class ReportsBySubordinatesView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Reports from everyone below a user in the org tree, through any number
+    of created_by levels. ?depth=1 limits it to the users they created
+    directly, ?depth=2 adds the next level, and so on.
+    """
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedDateCursorPagination
 
     def get_queryset(self):
         creator_id = self.kwargs['creator_id']
-        try:
-            creator_user = CustomUser.objects.get(id=creator_id)
-            subordinates = CustomUser.objects.filter(created_by=creator_user)  # Assuming 'manager' is the field linking to a user's manager
-            return Report.objects.filter(created_by__in=subordinates)
-        except CustomUser.DoesNotExist:
-            return Report.objects.none()
\ No newline at end of file
+        subordinates = subtree_user_ids(creator_id, parse_depth(self.request.query_params))
+        return Report.objects.filter(created_by_id__in=subordinates).select_related('created_by')
+
+
+class ReportsBySubordinatesSummaryView(generics.GenericAPIView):
+    """Report counts for a user's subtree, honouring the same ?depth=."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, creator_id):
+        depth = parse_depth(request.query_params)
+        reports = Report.objects.filter(created_by_id__in=subtree_user_ids(creator_id, depth))
+        counts = reports.aggregate(
+            reports=Count('pk'),
+            approved=Count('pk', filter=Q(status=True)),
+            pending=Count('pk', filter=Q(status=False)),
+            **{level: Count('pk', filter=Q(level=level)) for level, _ in Report.LEVEL_CHOICES}
+        )
+        counts['users'] = CustomUser.objects.filter(id__in=subtree_user_ids(creator_id, depth)).count()
+        return Response(counts, status=status.HTTP_200_OK)
+
+
+def parse_depth(params):
+    if not params.get('depth'):
+        return None
+    try:
+        depth = int(params['depth'])
+    except ValueError:
+        depth = 0
+    if depth < 1:
+        raise ValidationError({"depth": "Must be a positive integer."})
+    return depth
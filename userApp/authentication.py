@@ -0,0 +1,121 @@
+# user/authentication.py
+"""
+JWT authentication that remembers the user record behind a token.
+
+The stock JWTAuthentication loads the user row on every request. Here the
+row's field values are cached by user id, so a warm request authenticates
+without touching the database. The cache holds plain field dicts, never
+model instances, and every request gets a fresh CustomUser built from them.
+The password hash is left out of the cache, which may be shared; the few
+code paths that need it load it on first access, as a deferred field.
+
+USER_AUTH_CACHE picks where records live: 'local' (the default) keeps them
+in a bounded per-process TTL/LRU cache, any other value names an entry in
+CACHES shared by all processes. Entries are dropped when the user is saved
+or deleted (see userApp.signals); code that changes users with
+QuerySet.update() must call forget_authenticated_user() itself.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import TTLCache
+from .models import CustomUser
+
+
+class LocalUserCache:
+    """User records in this process only."""
+
+    def __init__(self, maxsize, ttl):
+        self.records = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id):
+        return self.records.get(user_id)
+
+    def set(self, user_id, record):
+        self.records.set(user_id, record)
+
+    def delete(self, user_id):
+        self.records.delete(user_id)
+
+    def clear(self):
+        self.records.clear()
+
+
+class SharedUserCache:
+    """User records in a Django cache shared between processes."""
+
+    key_prefix = 'auth-user:'
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, user_id):
+        return self.cache.get(f'{self.key_prefix}{user_id}')
+
+    def set(self, user_id, record):
+        self.cache.set(f'{self.key_prefix}{user_id}', record, self.ttl)
+
+    def delete(self, user_id):
+        self.cache.delete(f'{self.key_prefix}{user_id}')
+
+    def clear(self):
+        self.cache.clear()
+
+
+def build_user_cache(backend=None):
+    backend = backend or settings.USER_AUTH_CACHE
+    if backend == 'local':
+        return LocalUserCache(settings.USER_AUTH_CACHE_SIZE, settings.USER_AUTH_CACHE_TTL)
+    return SharedUserCache(backend, settings.USER_AUTH_CACHE_TTL)
+
+
+user_cache = build_user_cache()
+
+
+# Fields never written to the cache; authentication does not read them.
+UNCACHED_FIELDS = {'password'}
+
+
+def user_record(user):
+    """The user's concrete field values but UNCACHED_FIELDS, keyed by column attribute name."""
+    return {field.attname: getattr(user, field.attname)
+            for field in CustomUser._meta.concrete_fields if field.attname not in UNCACHED_FIELDS}
+
+
+def forget_authenticated_user(user_id):
+    user_cache.delete(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose user lookup is served from user_cache."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        record = user_cache.get(user_id)
+        if record is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user_record(user))
+        else:
+            user = self.user_model.from_db('default', list(record), list(record.values()))
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,38 @@
+# user/exports.py
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.utils.timezone import make_naive
+
+from exportApp.renderers import ExportDataset
+from .models import CustomUser
+
+HEADERS = ["ID", "First Name", "Last Name", "Username", "Email", "Phone", "Role", "Created At"]
+COLUMNS = ['id', 'first_name', 'last_name', 'username', 'email', 'phone', 'role', 'created_at']
+
+# str() of a naive datetime with microseconds, e.g. 2024-07-20 11:47:03.123456
+DATETIME_LENGTH = 26
+
+
+def user_dataset(queryset=None, title="Users", chunk_size=2000):
+    """
+    Describe the users in `queryset` for the export renderers: column widths
+    come from one aggregate query and rows are streamed with a chunked
+    iterator.
+    """
+    if queryset is None:
+        queryset = CustomUser.objects.all()
+
+    lengths = queryset.aggregate(
+        id=Max('id'),
+        **{column: Max(Length(column)) for column in COLUMNS[1:-1]}
+    )
+    max_lengths = [len(str(lengths['id'] or ''))]
+    max_lengths += [lengths[column] for column in COLUMNS[1:-1]]
+    max_lengths.append(DATETIME_LENGTH)
+
+    def rows():
+        for row in queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size):
+            # Excel cannot store timezone-aware datetimes
+            yield row[:-1] + (make_naive(row[-1]),)
+
+    return ExportDataset(title, HEADERS, rows(), max_lengths)
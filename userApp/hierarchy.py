@@ -0,0 +1,36 @@
+# user/hierarchy.py
+"""
+Org-hierarchy queries over CustomUser.created_by.
+
+A user's subtree (everyone they created, everyone those users created, and
+so on) is selected with a recursive CTE, so any subtree costs one query that
+walks the created_by index level by level inside the database.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import CustomUser
+
+
+def subtree_user_ids(root_id, max_depth=None):
+    """
+    Subquery selecting the ids of every user below `root_id` (not the root
+    itself), at most `max_depth` levels down. The depth is capped at
+    USER_HIERARCHY_MAX_DEPTH, which also stops a created_by cycle from
+    recursing forever.
+
+    Use it as `queryset.filter(created_by_id__in=subtree_user_ids(root))`.
+    """
+    depth = min(max_depth or settings.USER_HIERARCHY_MAX_DEPTH, settings.USER_HIERARCHY_MAX_DEPTH)
+    table = connection.ops.quote_name(CustomUser._meta.db_table)
+    sql = (
+        'WITH RECURSIVE subtree(id, depth) AS ('
+        f'SELECT id, 1 FROM {table} WHERE created_by_id = %s '
+        'UNION ALL '
+        f'SELECT child.id, subtree.depth + 1 FROM {table} child '
+        'INNER JOIN subtree ON child.created_by_id = subtree.id '
+        'WHERE subtree.depth < %s'
+        ') SELECT id FROM subtree'
+    )
+    return RawSQL(sql, (root_id, depth))
@@ -0,0 +1,218 @@
+# user/imports.py
+"""
+Bulk user import from a CSV or XLSX file.
+
+Rows are validated one by one for format, then checked for uniqueness
+against the database and the rest of the file with a few set-based queries.
+Passwords are hashed on a process pool, valid users are inserted with
+bulk_create and their credentials are queued in the email outbox, all in
+one transaction. Should a signup take one of the values before the insert,
+the uniqueness check is rerun and the insert retried without those rows.
+The result is a report with one entry per data row.
+"""
+import csv
+import io
+import secrets
+import string
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from RRA_report_backend.responsecache import bump_version
+
+from .lookup import forget_user
+from .models import CustomUser
+from .outbox import enqueue_many
+from .rollups import apply_user_rollup_deltas
+from .serializers import UserImportRowSerializer, welcome_email
+
+COLUMNS = ('first_name', 'last_name', 'email', 'phone', 'role')
+LOOKUP_CHUNK = 500
+PASSWORD_CHARS = string.ascii_letters + string.digits
+# Inserts retried when concurrent signups keep colliding with the file.
+IMPORT_ATTEMPTS = 3
+CONFLICT_MESSAGE = 'Could not be saved because of concurrent changes; import the row again.'
+
+
+def read_rows(upload):
+    """
+    (line number, row dict) for every non-blank data row of an uploaded
+    .csv or .xlsx file. Raises ValueError for an unusable file.
+    """
+    name = upload.name.lower()
+    if name.endswith('.csv'):
+        lines = csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+    elif name.endswith('.xlsx'):
+        try:
+            lines = load_workbook(upload, read_only=True, data_only=True).active.iter_rows(values_only=True)
+        except Exception:
+            raise ValueError('The file is not a readable .xlsx workbook.')
+    else:
+        raise ValueError('Upload a .csv or .xlsx file.')
+
+    try:
+        return data_rows(lines)
+    except csv.Error as e:
+        raise ValueError(f'The file is not a readable CSV file: {e}')
+
+
+def data_rows(lines):
+    header = [cell_text(cell).lower().replace(' ', '_') for cell in next(lines, ())]
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f'Missing column(s): {", ".join(missing)}.')
+
+    rows = []
+    for number, values in enumerate(lines, start=2):
+        row = dict(zip(header, (cell_text(cell) for cell in values)))
+        if not any(row.values()):
+            continue
+        if len(rows) == settings.USER_IMPORT_MAX_ROWS:
+            raise ValueError(f'A file may hold at most {settings.USER_IMPORT_MAX_ROWS} users.')
+        rows.append((number, {column: row.get(column, '') for column in COLUMNS}))
+    return rows
+
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def existing_values(field, values):
+    """The subset of `values` already stored in CustomUser.`field`."""
+    values = list(values)
+    taken = set()
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[start:start + LOOKUP_CHUNK]
+        taken.update(CustomUser.objects.filter(**{f'{field}__in': chunk}).values_list(field, flat=True))
+    return taken
+
+
+def random_string(length):
+    return ''.join(secrets.choice(PASSWORD_CHARS) for _ in range(length))
+
+
+def unique_usernames(names):
+    """A `first_last_xxxxx` username for each (first, last) pair, unused so far."""
+    usernames = [f'{first}_{last}_{random_string(5)}' for first, last in names]
+    while True:
+        clashes = existing_values('username', usernames)
+        counts = Counter(usernames)
+        retry = [i for i, username in enumerate(usernames) if username in clashes or counts[username] > 1]
+        if not retry:
+            return usernames
+        for i in retry:
+            first, last = names[i]
+            usernames[i] = f'{first}_{last}_{random_string(5)}'
+
+
+def hash_passwords(passwords):
+    """
+    make_password() for every password. PBKDF2 is deliberately slow, so
+    larger batches are spread over USER_IMPORT_HASH_WORKERS processes.
+    Workers are spawned rather than forked, as the web process may be
+    running threads.
+    """
+    workers = settings.USER_IMPORT_HASH_WORKERS
+    if workers < 2 or len(passwords) < settings.USER_IMPORT_PARALLEL_MIN:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def check_unique(candidates, results):
+    """
+    The (row number, data) pairs of `candidates` whose email and phone are
+    free, both in the database and among the earlier candidates. The others
+    get an error entry in `results`.
+    """
+    taken = {
+        'email': existing_values('email', {data['email'] for _, data in candidates}),
+        'phone': existing_values('phone', {data['phone'] for _, data in candidates}),
+    }
+    messages = {'email': 'Email is already registered.', 'phone': 'Phone number is already registered.'}
+    first_seen = {'email': {}, 'phone': {}}
+    accepted = []
+    for number, data in candidates:
+        errors = {}
+        for field in ('email', 'phone'):
+            value = data[field]
+            if value in taken[field]:
+                errors[field] = [messages[field]]
+            elif value in first_seen[field]:
+                errors[field] = [f'Already used on row {first_seen[field][value]}.']
+            else:
+                first_seen[field][value] = number
+        if errors:
+            results.append({'row': number, 'status': 'error', 'errors': errors})
+        else:
+            accepted.append((number, data))
+    return accepted
+
+
+def import_users(rows, created_by):
+    """
+    Create a user for every valid row of `rows` (as returned by read_rows).
+    Returns one result per row: the new user's id and username, or the
+    validation errors.
+    """
+    results = []
+    valid = []
+    for number, row in rows:
+        serializer = UserImportRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            results.append({'row': number, 'status': 'error', 'errors': serializer.errors})
+
+    accepted = check_unique(valid, results)
+    if not accepted:
+        return sorted(results, key=lambda result: result['row'])
+
+    passwords = {number: random_string(6) for number, _ in accepted}
+    hashes = dict(zip(passwords, hash_passwords(list(passwords.values()))))
+    for attempt in range(IMPORT_ATTEMPTS):
+        usernames = unique_usernames([(data['first_name'], data['last_name']) for _, data in accepted])
+        users = [
+            CustomUser(username=username, password=hashes[number], created_by=created_by, **data)
+            for (number, data), username in zip(accepted, usernames)
+        ]
+        try:
+            with transaction.atomic():
+                users = CustomUser.objects.bulk_create(users, batch_size=settings.USER_IMPORT_BATCH_SIZE)
+                # bulk_create skips the signals that keep the rollups and the
+                # identifier cache in step
+                apply_user_rollup_deltas(Counter(timezone.localdate(user.created_at) for user in users))
+                bump_version(CustomUser)
+                enqueue_many(welcome_email(user.email, user.username, passwords[number])
+                             for (number, _), user in zip(accepted, users))
+                transaction.on_commit(lambda: [forget_user(user) for user in users])
+        except IntegrityError:
+            # Someone signed up with one of the values (or drew one of the
+            # usernames) since they were checked: report those rows and
+            # insert the rest.
+            accepted = check_unique(accepted, results)
+            if not accepted:
+                break
+            continue
+        results.extend(
+            {'row': number, 'status': 'created', 'id': user.id, 'username': user.username}
+            for (number, _), user in zip(accepted, users)
+        )
+        break
+    else:
+        results.extend(
+            {'row': number, 'status': 'error', 'errors': {'non_field_errors': [CONFLICT_MESSAGE]}}
+            for number, _ in accepted
+        )
+
+    return sorted(results, key=lambda result: result['row'])
@@ -0,0 +1,53 @@
+# user/lookup.py
+"""
+Resolve a user identifier (username, email or phone) to a user id with one
+indexed lookup, remembering the answer for a short while.
+
+Entries are dropped when the user is saved or deleted (see userApp.signals),
+so a renamed user is never resolved through a stale identifier in this
+process; other processes see the change within USER_LOOKUP_CACHE_TTL.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .cache import TTLCache
+from .models import CustomUser
+
+identifier_cache = TTLCache(maxsize=settings.USER_LOOKUP_CACHE_SIZE, ttl=settings.USER_LOOKUP_CACHE_TTL)
+
+_MISSING = object()
+
+
+def classify_identifier(identifier):
+    """The field an identifier most likely refers to."""
+    if '@' in identifier:
+        return 'email'
+    if identifier.isdigit():
+        return 'phone'
+    return 'username'
+
+
+def resolve_user_id(identifier):
+    """
+    Id of the user whose username, email or phone equals `identifier`, or
+    None. Usually a single lookup on the unique column the classifier picks;
+    the three-way match is only needed when that guess misses (e.g. a
+    username made of digits).
+    """
+    user_id = identifier_cache.get(identifier, _MISSING)
+    if user_id is not _MISSING:
+        return user_id
+
+    users = CustomUser.objects.values_list('id', flat=True)
+    user_id = users.filter(**{classify_identifier(identifier): identifier}).first()
+    if user_id is None:
+        user_id = users.filter(Q(username=identifier) | Q(email=identifier) | Q(phone=identifier)).first()
+    identifier_cache.set(identifier, user_id)
+    return user_id
+
+
+def forget_user(user):
+    """Drop cached resolutions to `user` and to its current identifiers."""
+    identifier_cache.delete_value(user.pk)
+    for identifier in (user.username, user.email, user.phone):
+        identifier_cache.delete(identifier)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding tokens and their blacklist entries in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Outstanding tokens deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk')
+        last_pk = 0
+        deleted = 0
+        while True:
+            # walk the primary key so each batch reads a short index range
+            # instead of rescanning the rows already purged
+            pks = list(expired.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            with transaction.atomic():
+                # deleting an outstanding token cascades to its blacklist row
+                deleted += OutstandingToken.objects.filter(pk__in=pks).delete()[0]
+            last_pk = pks[-1]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(f'Purged {deleted} expired token row(s).')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from userApp.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Messages sent per SMTP connection.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = drain(options['batch_size'])
+            if sent:
+                self.stdout.write(f'Sent {sent} email(s).')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 13:45
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    CustomUser = apps.get_model('userApp', 'CustomUser')
+    UserDailyStat = apps.get_model('userApp', 'UserDailyStat')
+    rows = (CustomUser.objects.annotate(date=TruncDate('created_at'))
+            .values('date')
+            .annotate(count=Count('pk'))
+            .order_by())
+    UserDailyStat.objects.bulk_create([UserDailyStat(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userApp', '0003_customuser_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+TRIGRAM_INDEXES = {
+    'user_first_name_trgm_idx': 'first_name',
+    'user_last_name_trgm_idx': 'last_name',
+}
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # first_name__icontains / last_name__icontains compile to
+    # UPPER(col::text) LIKE UPPER('%x%'), which only a trigram index on the
+    # same expression can serve. PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.db.models.functions import Upper
+    CustomUser = apps.get_model('userApp', 'CustomUser')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, field in TRIGRAM_INDEXES.items():
+        schema_editor.add_index(CustomUser, GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name))
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userApp', '0004_userdailystat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_at', 'id'], name='user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_by', 'created_at'], name='user_creator_created_idx'),
+        ),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
@@ -0,0 +1,160 @@
+# user/outbox.py
+"""
+Durable outgoing email.
+
+Views call `enqueue()`, which only writes an OutboxEmail row, so a request
+never waits on SMTP. Rows are delivered by `drain()`, which claims a batch
+of due messages and sends them over one reused connection of the configured
+EMAIL_BACKEND. A failed message is retried with exponential backoff
+(EMAIL_OUTBOX_BACKOFF_SECONDS doubled per attempt) until it has been tried
+EMAIL_OUTBOX_MAX_ATTEMPTS times.
+
+`drain()` runs on a daemon thread in the web process, woken when a new
+message commits, or from `manage.py send_outbox`. Claims make it safe to
+run several senders at once; a claim older than EMAIL_OUTBOX_CLAIM_TIMEOUT
+(a sender that died mid-batch) is taken over.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from RRA_report_backend.metrics import EMAIL_SECONDS, EMAILS
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(subject, body, from_email, recipients):
+    email = OutboxEmail.objects.create(subject=subject, body=body, from_email=from_email, to=list(recipients))
+    if settings.EMAIL_OUTBOX_THREAD:
+        transaction.on_commit(wake_sender)
+    return email
+
+
+def enqueue_many(messages):
+    """Queue (subject, body, from_email, recipients) tuples with one insert per batch."""
+    emails = OutboxEmail.objects.bulk_create([
+        OutboxEmail(subject=subject, body=body, from_email=from_email, to=list(recipients))
+        for subject, body, from_email, recipients in messages
+    ], batch_size=500)
+    if emails and settings.EMAIL_OUTBOX_THREAD:
+        transaction.on_commit(wake_sender)
+    return emails
+
+
+def claim_batch(batch_size):
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+    due = OutboxEmail.objects.filter(
+        Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale)
+    )
+    ids = list(due.order_by('next_attempt_at').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    claim = uuid.uuid4()
+    # The status filter is repeated so a row claimed by another sender in
+    # the meantime is left alone.
+    due.filter(id__in=ids).update(status='sending', claim=claim, claimed_at=now)
+    return list(OutboxEmail.objects.filter(claim=claim).order_by('next_attempt_at'))
+
+
+def backoff(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def drain(batch_size=None):
+    """Send due messages batch by batch until none are left. Returns the number sent."""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return sent
+        sent += send_batch(batch)
+
+
+def send_batch(batch):
+    connection = get_connection(fail_silently=False)
+    delivered, failed = [], []
+    try:
+        connection.open()
+        for email in batch:
+            start = time.perf_counter()
+            try:
+                EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection).send()
+            except Exception as error:
+                email.last_error = repr(error)
+                failed.append(email)
+                EMAILS.inc(result='failed')
+            else:
+                delivered.append(email)
+                EMAILS.inc(result='sent')
+            EMAIL_SECONDS.observe(time.perf_counter() - start)
+    except Exception as error:
+        # The connection itself failed: every message not yet sent retries.
+        done = {email.pk for email in delivered + failed}
+        for email in batch:
+            if email.pk not in done:
+                email.last_error = repr(error)
+                failed.append(email)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning('Closing the outbox mail connection failed', exc_info=True)
+
+    now = timezone.now()
+    for email in delivered:
+        email.status, email.body, email.sent_at, email.last_error = 'sent', '', now, ''
+        email.attempts += 1
+    for email in failed:
+        email.attempts += 1
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            # the body may carry credentials; do not keep it once given up on
+            email.status, email.body = 'failed', ''
+            logger.error('Giving up on outbox email %s: %s', email.pk, email.last_error)
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + backoff(email.attempts)
+    for email in batch:
+        email.claim = email.claimed_at = None
+    OutboxEmail.objects.bulk_update(
+        batch, ['status', 'body', 'sent_at', 'attempts', 'next_attempt_at', 'last_error', 'claim', 'claimed_at'])
+    return len(delivered)
+
+
+_wakeup = threading.Event()
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def wake_sender():
+    """Start the in-process sender thread if needed and have it drain now."""
+    global _sender
+    with _sender_lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = threading.Thread(target=_sender_loop, name='outbox-sender', daemon=True)
+            _sender.start()
+    _wakeup.set()
+
+
+def _sender_loop():
+    while True:
+        # Also wake up periodically for messages waiting on a retry.
+        _wakeup.wait(settings.EMAIL_OUTBOX_POLL_SECONDS)
+        _wakeup.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception('Outbox sender failed')
+        finally:
+            connections.close_all()
@@ -0,0 +1,134 @@
+# user/revocation.py
+"""
+In-memory view of the refresh-token blacklist.
+
+Checking a refresh token against token_blacklist costs a join on every
+refresh, although almost every token checked has not been revoked. The
+RevocationSet keeps a Bloom filter of the jtis of blacklisted, unexpired
+tokens: a miss proves the token is not revoked and needs no query, a hit
+(a revoked token or a rare false positive) is confirmed against the table.
+
+The filter is loaded on first use and extended by this process's logouts.
+Logouts in other processes are picked up by an incremental sync that reads
+new blacklist rows at most every TOKEN_REVOCATION_SYNC_SECONDS, so a token
+revoked elsewhere may be accepted for that long. Transactions can commit
+out of pk order, so each sync also re-reads the rows blacklisted within
+TOKEN_REVOCATION_SYNC_MARGIN_SECONDS of the previous one; adding a jti
+twice is harmless. Bloom filters cannot drop
+entries, so the filter is rebuilt from the unexpired rows every
+TOKEN_REVOCATION_REBUILD_SECONDS, which lets expired tokens age out.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a false-positive rate of
+    about `error_rate` while it holds at most `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        if item in self:
+            # already present (or a false positive): the bits are all set
+            return
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationSet:
+    def __init__(self, capacity, error_rate, sync_seconds, rebuild_seconds, margin_seconds=60,
+                 timer=time.monotonic):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.margin = timedelta(seconds=margin_seconds)
+        self.timer = timer
+        self.bloom = None
+        self.last_id = 0
+        self.synced_at = self.built_at = None
+        # wall-clock start of the last read, for the blacklisted_at window
+        self.read_from = None
+        self._lock = threading.Lock()
+
+    def _rows(self, queryset):
+        return queryset.order_by('pk').values_list('pk', 'token__jti').iterator()
+
+    def _rebuild(self):
+        self.read_from = timezone.now()
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=self.read_from)
+        rows = list(self._rows(live))
+        self.bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for pk, jti in rows:
+            self.bloom.add(jti)
+        self.last_id = max([pk for pk, _ in rows] + [self.last_id])
+        self.synced_at = self.built_at = self.timer()
+
+    def _sync(self):
+        # Rows with a lower pk than last_id may still commit after it was
+        # read, so also take the recent ones again.
+        since, self.read_from = self.read_from - self.margin, timezone.now()
+        recent = BlacklistedToken.objects.filter(Q(pk__gt=self.last_id) | Q(blacklisted_at__gte=since))
+        for pk, jti in self._rows(recent):
+            self.bloom.add(jti)
+            self.last_id = max(self.last_id, pk)
+        self.synced_at = self.timer()
+
+    def _refresh(self):
+        now = self.timer()
+        if (self.bloom is None or now - self.built_at >= self.rebuild_seconds
+                or self.bloom.count > self.bloom.capacity):
+            self._rebuild()
+        elif now - self.synced_at >= self.sync_seconds:
+            self._sync()
+
+    def might_be_revoked(self, jti):
+        """False only if `jti` is certainly not blacklisted (as of the last sync)."""
+        with self._lock:
+            self._refresh()
+            return jti in self.bloom
+
+    def add(self, jti):
+        """Record a token this process has just blacklisted."""
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self.bloom = None
+            self.last_id = 0
+
+
+revocations = RevocationSet(
+    capacity=settings.TOKEN_REVOCATION_CAPACITY,
+    error_rate=settings.TOKEN_REVOCATION_ERROR_RATE,
+    sync_seconds=settings.TOKEN_REVOCATION_SYNC_SECONDS,
+    rebuild_seconds=settings.TOKEN_REVOCATION_REBUILD_SECONDS,
+    margin_seconds=settings.TOKEN_REVOCATION_SYNC_MARGIN_SECONDS,
+)
@@ -0,0 +1,72 @@
+# user/rollups.py
+"""
+Maintenance of the UserDailyStat rollup table.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from RRA_report_backend.responsecache import bump_version
+
+from .models import CustomUser, UserDailyStat
+
+
+def bump_user_rollup(date, delta):
+    if UserDailyStat.objects.filter(date=date).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            UserDailyStat.objects.create(date=date, count=delta)
+    except IntegrityError:
+        # Another request created the row first
+        UserDailyStat.objects.filter(date=date).update(count=F('count') + delta)
+
+
+def apply_user_rollup_deltas(deltas):
+    """Apply a {date: delta} mapping, e.g. after a bulk insert."""
+    for date, delta in deltas.items():
+        if delta:
+            bump_user_rollup(date, delta)
+
+
+def rebuild_user_rollups(first_day=None, last_day=None, batch_days=31):
+    """
+    Recompute the rollup rows for [first_day, last_day] from the users
+    table, `batch_days` days per transaction. Without bounds the whole table
+    is rebuilt and rows outside its date range are removed.
+    """
+    full = first_day is None and last_day is None
+    if first_day is None or last_day is None:
+        bounds = CustomUser.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            if full:
+                UserDailyStat.objects.all().delete()
+            bump_version(CustomUser)
+            return 0
+        first_day = first_day or timezone.localdate(bounds['first'])
+        last_day = last_day or timezone.localdate(bounds['last'])
+
+    if full:
+        UserDailyStat.objects.exclude(date__range=(first_day, last_day)).delete()
+
+    written = 0
+    day = first_day
+    while day <= last_day:
+        batch_last = min(day + timedelta(days=batch_days - 1), last_day)
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = timezone.make_aware(datetime.combine(batch_last + timedelta(days=1), time.min))
+        rows = (CustomUser.objects.filter(created_at__gte=start, created_at__lt=end)
+                .annotate(date=TruncDate('created_at'))
+                .values('date')
+                .annotate(count=Count('pk'))
+                .order_by())
+        with transaction.atomic():
+            UserDailyStat.objects.filter(date__range=(day, batch_last)).delete()
+            written += len(UserDailyStat.objects.bulk_create([UserDailyStat(**row) for row in rows]))
+        day = batch_last + timedelta(days=1)
+    # the count and trend responses are computed from the rollups
+    bump_version(CustomUser)
+    return written
@@ -3,10 +3,13 @@ This file contains serializers for the CustomUser model.
 """
 
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import CustomUser
+from RRA_report_backend.fieldsets import SparseFieldsetSerializerMixin
+from .tokens import RefreshToken
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'first_name', 'last_name', 'username', 'email', 'phone', 'role', 'created_at', 'created_by']
@@ -14,6 +17,32 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 
+def check_phone_format(value):
+    if not value.startswith(('078', '079', '072', '073')) or len(value) != 10:
+        raise serializers.ValidationError("Phone number must start with 078, 079, 072, or 073 and be 10 digits long.")
+
+
+def check_email_format(value):
+    if not value.endswith('@gmail.com'):
+        raise serializers.ValidationError("Email must end with @gmail.com.")
+
+
+def check_role(value):
+    allowed_roles = ['unit user', 'head of division', 'head of department']
+    if value not in allowed_roles:
+        raise serializers.ValidationError("Role must be one of: 'unit user', 'head of division', 'head of department'.")
+
+
+def welcome_email(email, username, password):
+    """Subject, body, sender and recipients of a new user's credentials email."""
+    return (
+        'Welcome to RRA Report Management System',
+        f'Hello,\n\nYou have been registered on RRA REPORT MANAGEMENT SYSTEM with the following details:\n\nUsername: {username}\nPassword: {password}\n\nYou can change these credentials after logging in.\n\nRegards!',
+        'from@example.com',
+        [email],
+    )
+
+
 class SignupSerializer(serializers.ModelSerializer):
     created_by = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -22,23 +51,19 @@ class SignupSerializer(serializers.ModelSerializer):
         fields = ['first_name', 'last_name', 'email', 'phone', 'role', 'created_by']
 
     def validate_phone(self, value):
-        if not value.startswith(('078', '079', '072', '073')) or len(value) != 10:
-            raise serializers.ValidationError("Phone number must start with 078, 079, 072, or 073 and be 10 digits long.")
+        check_phone_format(value)
         if CustomUser.objects.filter(phone=value).exists():
             raise serializers.ValidationError("Phone number is already registered.")
         return value
 
     def validate_email(self, value):
-        if not value.endswith('@gmail.com'):
-            raise serializers.ValidationError("Email must end with @gmail.com.")
+        check_email_format(value)
         if CustomUser.objects.filter(email=value).exists():
             raise serializers.ValidationError("Email is already registered.")
         return value
 
     def validate_role(self, value):
-        allowed_roles = ['unit user', 'head of division', 'head of department']
-        if value not in allowed_roles:
-            raise serializers.ValidationError("Role must be one of: 'unit user', 'head of division', 'head of department'.")
+        check_role(value)
         return value
 
     def create(self, validated_data):
@@ -73,14 +98,8 @@ class SignupSerializer(serializers.ModelSerializer):
         return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
     def send_credentials(self, email, username, password):
-        from django.core.mail import send_mail
-        send_mail(
-            'Welcome to RRA Report Management System',
-            f'Hello,\n\nYou have been registered on RRA REPORT MANAGEMENT SYSTEM with the following details:\n\nUsername: {username}\nPassword: {password}\n\nYou can change these credentials after logging in.\n\nRegards!',
-            'from@example.com',
-            [email],
-            fail_silently=False,
-        )
+        from .outbox import enqueue
+        enqueue(*welcome_email(email, username, password))
        
              
         
@@ -125,4 +144,32 @@ class ContactUsSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100)
     email = serializers.EmailField()
     subject = serializers.CharField(max_length=200)
-    description = serializers.CharField()
\ No newline at end of file
+    description = serializers.CharField()
+
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class UserImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk user import. Only the per-row rules are checked here;
+    uniqueness is checked for the whole file at once by userApp.imports.
+    """
+    first_name = serializers.CharField(max_length=30)
+    last_name = serializers.CharField(max_length=30)
+    email = serializers.EmailField()
+    phone = serializers.CharField(max_length=15)
+    role = serializers.CharField(max_length=20)
+
+    def validate_phone(self, value):
+        check_phone_format(value)
+        return value
+
+    def validate_email(self, value):
+        check_email_format(value)
+        return value
+
+    def validate_role(self, value):
+        check_role(value)
+        return value
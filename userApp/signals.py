@@ -0,0 +1,34 @@
+# user/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from RRA_report_backend.responsecache import bump_version
+from .authentication import forget_authenticated_user
+from .lookup import forget_user
+from .models import CustomUser
+from .rollups import bump_user_rollup
+
+
+@receiver(post_save, sender=CustomUser)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    if created:
+        bump_user_rollup(timezone.localdate(instance.created_at), 1)
+
+
+@receiver(post_delete, sender=CustomUser)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    bump_user_rollup(timezone.localdate(instance.created_at), -1)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_identifiers(sender, instance, **kwargs):
+    forget_user(instance)
+    forget_authenticated_user(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_version(CustomUser)
@@ -1,3 +1,484 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from reportApp.seed import build_user, seed_users
+from RRA_report_backend.responsecache import response_cache
+from RRA_report_backend.queryplans import capture_selects, plan_problems
+from . import authentication, imports
+from .authentication import SharedUserCache, user_cache
+from .imports import hash_passwords
+from .models import CustomUser, OutboxEmail, UserDailyStat
+from .outbox import drain, enqueue
+from .revocation import BloomFilter, RevocationSet, revocations
+from .tokens import RefreshToken
+
+
+class UserQueryBudgetTests(TestCase):
+    """
+    Every user read path must run a constant number of queries, however many
+    users it returns. The budgets below are checked at 10, 1,000 and 10,000
+    users.
+    """
+    sizes = [10, 1000, 10000]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def budgets(self):
+        return [
+            (reverse('user-list'), 1),
+            (reverse('user-detail', args=[self.admin.id]), 2),  # +1 conditional GET validator
+            (reverse('user-by-username', args=[self.admin.username]), 1),
+            (reverse('user-by-email', args=[self.admin.email]), 1),
+            (reverse('user-by-phone', args=[self.admin.phone]), 1),
+            (reverse('user-by-firstname', args=['First']), 1),
+            (reverse('user-by-lastname', args=['Last']), 1),
+            (reverse('user-count'), 1),
+            (reverse('user-trends'), 1),
+            (reverse('user-trends') + '?bucket=week', 1),
+            (reverse('created-users-list'), 1),
+            (reverse('user-download-pdf'), 3),
+            (reverse('user-download-excel'), 3),
+        ]
+
+    def test_query_budget_is_independent_of_row_count(self):
+        seeded = 1
+        for size in self.sizes:
+            seed_users(size - seeded, created_by=self.admin)
+            seeded = size
+            for url, budget in self.budgets():
+                with self.subTest(rows=size, url=url):
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class UserQueryPlanTests(TestCase):
+    """
+    User endpoints must reach users through an index rather than a full
+    scan or an unindexed sort. Not checked: the first/last name searches,
+    which are served by trigram indexes on PostgreSQL only, and the
+    whole-table exports.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        heads = seed_users(50, created_by=cls.admin)
+        for head in heads[:5]:
+            seed_users(1000, created_by=head)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_endpoints_use_indexes(self):
+        user = CustomUser.objects.last()
+        urls = [
+            reverse('user-list'),
+            reverse('user-detail', args=[user.id]),
+            reverse('user-by-username', args=[user.username]),
+            reverse('user-by-email', args=[user.email]),
+            reverse('user-by-phone', args=[user.phone]),
+            reverse('user-count'),
+            reverse('user-trends'),
+            reverse('created-users-list'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with capture_selects() as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                problems = [problem for sql, params in queries
+                            for problem in plan_problems(sql, params, {CustomUser._meta.db_table})]
+                self.assertEqual(problems, [])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_users(1, role='admin')[0]
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = reverse('user-detail', args=[self.user.id])
+
+    def test_warm_request_skips_user_query(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertFalse(response.wsgi_request.user._state.adding)
+
+    def test_password_is_loaded_lazily(self):
+        self.client.get(self.url)
+        user = self.client.get(self.url).wsgi_request.user
+        self.assertIn('password', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('password'))
+
+    def test_save_invalidates(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_delete_invalidates(self):
+        self.client.get(self.url)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_shared_backend(self):
+        shared = SharedUserCache('default', ttl=60)
+        original, authentication.user_cache = authentication.user_cache, shared
+        try:
+            shared.clear()
+            self.client.get(self.url)
+            with self.assertNumQueries(2):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertNotIn('password', shared.get(self.user.id))
+            self.user.save()
+            self.assertIsNone(shared.get(self.user.id))
+        finally:
+            authentication.user_cache = original
+
+
+class TokenRevocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_users(1, role='admin')[0]
+
+    def setUp(self):
+        revocations.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': str(token)})
+
+    def test_unrevoked_refresh_needs_no_query(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(token).status_code, 200)
+
+    def test_logout_revokes(self):
+        token = RefreshToken.for_user(self.user)
+        self.refresh(token)
+        response = self.client.post(reverse('logout'), {'refresh_token': str(token)})
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_revocations_from_other_processes_are_synced(self):
+        now = [0.0]
+        revoked = RevocationSet(capacity=100, error_rate=0.001, sync_seconds=5,
+                                rebuild_seconds=3600, timer=lambda: now[0])
+        token = RefreshToken.for_user(self.user)
+        jti = token['jti']
+        self.assertFalse(revoked.might_be_revoked(jti))
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=jti))
+        self.assertFalse(revoked.might_be_revoked(jti))
+        now[0] = 5
+        self.assertTrue(revoked.might_be_revoked(jti))
+
+    def test_revocations_committed_out_of_pk_order_are_synced(self):
+        now = [0.0]
+        revoked = RevocationSet(capacity=100, error_rate=0.001, sync_seconds=5,
+                                rebuild_seconds=3600, timer=lambda: now[0])
+        late, early = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        self.assertFalse(revoked.might_be_revoked(late['jti']))
+        BlacklistedToken.objects.create(pk=10, token=OutstandingToken.objects.get(jti=early['jti']))
+        now[0] = 5
+        self.assertTrue(revoked.might_be_revoked(early['jti']))
+        # A lower pk whose transaction committed after pk 10 was synced.
+        BlacklistedToken.objects.create(pk=5, token=OutstandingToken.objects.get(jti=late['jti']))
+        now[0] = 10
+        self.assertTrue(revoked.might_be_revoked(late['jti']))
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+        self.assertTrue(all(f'member-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_purge_tokens(self):
+        live = RefreshToken.for_user(self.user)
+        expired = [RefreshToken.for_user(self.user) for _ in range(5)]
+        OutstandingToken.objects.filter(jti__in=[token['jti'] for token in expired]).update(
+            expires_at=timezone.now() - timedelta(minutes=1))
+        for token in expired[:2] + [live]:
+            token.blacklist()
+        call_command('purge_tokens', batch_size=2, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class FlakyEmailBackend(EmailBackend):
+    """locmem backend that counts connections and rejects 'bounce' addresses."""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any('bounce' in address for message in messages for address in message.to):
+            raise ConnectionError('mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='userApp.tests.FlakyEmailBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        FlakyEmailBackend.opened = 0
+
+    def test_contact_us_only_queues(self):
+        response = APIClient().post(reverse('contact_us'), {
+            'name': 'Jane', 'email': 'jane@gmail.com', 'subject': 'Hi', 'description': 'Hello there',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.get().status, 'pending')
+
+    def test_drain_sends_batch_over_one_connection(self):
+        for i in range(5):
+            enqueue('Welcome', f'Password: secret{i}', 'from@example.com', [f'user{i}@gmail.com'])
+        self.assertEqual(drain(batch_size=10), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(mail.outbox[0].body, 'Password: secret0')
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'body')), {('sent', '')})
+        self.assertEqual(drain(), 0)
+
+    def test_failures_back_off_then_give_up(self):
+        enqueue('Welcome', 'Password: secret', 'from@example.com', ['bounce@gmail.com'])
+        enqueue('Welcome', 'body', 'from@example.com', ['fine@gmail.com'])
+        self.assertEqual(drain(), 1)
+        email = OutboxEmail.objects.get(status='pending')
+        self.assertEqual((email.attempts, email.body), (1, 'Password: secret'))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(drain(), 0)
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('userApp.outbox', 'ERROR'):
+            drain()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+        self.assertIn('mailbox unavailable', email.last_error)
+        self.assertEqual(email.body, '')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], USER_IMPORT_HASH_WORKERS=1)
+class UserImportTests(TestCase):
+    header = 'first_name,last_name,email,phone,role\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, name, content):
+        return self.client.post(reverse('user-import'), {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def csv(self, count, start=0):
+        lines = [f'Ann,Lee{i},ann{i}@gmail.com,078{i:07d},unit user' for i in range(start, start + count)]
+        return (self.header + '\n'.join(lines)).encode()
+
+    def test_per_row_report(self):
+        rows = self.header + '\n'.join([
+            'Ann,Lee,ann@gmail.com,0781234567,unit user',
+            f'Bob,Ray,{self.admin.email},0781234568,unit user',
+            'Cat,Kim,cat@yahoo.com,0781234569,unit user',
+            'Dan,Oak,dan@gmail.com,0781234567,head of division',
+            '',
+            'Eve,Fox,eve@gmail.com,0781234570,head of department',
+        ])
+        response = self.upload('users.csv', rows.encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        report = {row['row']: row for row in response.data['rows']}
+        self.assertEqual([report[n]['status'] for n in (2, 3, 4, 5, 7)], ['created', 'error', 'error', 'error', 'created'])
+        self.assertEqual(report[3]['errors'], {'email': ['Email is already registered.']})
+        self.assertIn('email', report[4]['errors'])
+        self.assertEqual(report[5]['errors'], {'phone': ['Already used on row 2.']})
+
+        ann = CustomUser.objects.get(pk=report[2]['id'])
+        self.assertEqual((ann.username, ann.created_by), (report[2]['username'], self.admin))
+        email = OutboxEmail.objects.get(to=['ann@gmail.com'])
+        password = email.body.split('Password: ')[1].split()[0]
+        self.assertTrue(check_password(password, ann.password))
+        self.assertEqual(UserDailyStat.objects.get(date=timezone.localdate()).count, 3)
+
+    def test_xlsx(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['First Name', 'Last Name', 'Email', 'Phone', 'Role'])
+        sheet.append(['Ann', 'Lee', 'ann@gmail.com', '0781234567', 'unit user'])
+        content = io.BytesIO()
+        workbook.save(content)
+        response = self.upload('users.xlsx', content.getvalue())
+        self.assertEqual(response.data['created'], 1)
+
+    def test_bad_files(self):
+        self.assertEqual(self.upload('users.txt', b'x').status_code, 400)
+        self.assertEqual(self.upload('users.csv', b'first_name,email\nAnn,a@gmail.com').status_code, 400)
+        self.assertEqual(self.upload('users.xlsx', b'not a workbook').status_code, 400)
+        oversized = self.header.encode() + b'"' + b'x' * 200000 + b'",Lee,a@gmail.com,0781234567,unit user'
+        response = self.upload('users.csv', oversized)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not a readable CSV file', response.data['error'])
+
+    def test_query_count_is_independent_of_row_count(self):
+        with CaptureQueriesContext(connection) as small:
+            self.upload('users.csv', self.csv(5))
+        with CaptureQueriesContext(connection) as large:
+            self.upload('users.csv', self.csv(60, start=5))
+        self.assertEqual(CustomUser.objects.count(), 66)
+        self.assertEqual(len(small), len(large))
+
+
+    def test_signup_racing_the_import(self):
+        def hash_during_signup(passwords):
+            # A signup commits the file's email between the check and the insert.
+            user = build_user(99, 'unit user', None, '')
+            user.email = 'ann1@gmail.com'
+            user.save()
+            return real_hash(passwords)
+
+        real_hash = imports.hash_passwords
+        with mock.patch.object(imports, 'hash_passwords', hash_during_signup):
+            response = self.upload('users.csv', self.csv(3))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        report = {row['row']: row for row in response.data['rows']}
+        self.assertEqual(report[3]['errors'], {'email': ['Email is already registered.']})
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+
+
+class HashPasswordsTests(TestCase):
+    @override_settings(USER_IMPORT_HASH_WORKERS=2, USER_IMPORT_PARALLEL_MIN=1)
+    def test_process_pool(self):
+        hashes = hash_passwords(['one', 'two', 'three'])
+        self.assertEqual([check_password(password, hashed) for password, hashed in
+                          zip(['one', 'two', 'three'], hashes)], [True] * 3)
+
+
+class UserConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_detail_and_export(self):
+        for url in [reverse('user-detail', args=[self.admin.id]), reverse('user-download-excel')]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(1):
+                    cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(cached.status_code, 304)
+                self.admin.save()
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+    def test_sparse_detail_is_another_representation(self):
+        url = reverse('user-detail', args=[self.admin.id])
+        full = self.client.get(url)
+        sparse = self.client.get(url + '?fields=id')
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+        self.assertEqual(self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=full['ETag']).status_code, 200)
+
+
+class UserSparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        seed_users(5, created_by=cls.admin)
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fields_limit_output_and_columns(self):
+        url = reverse('user-list') + '?fields=id,username,role'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'username', 'role'])
+        table = CustomUser._meta.db_table
+        sql = next(query['sql'] for query in queries.captured_queries
+                   if f'FROM "{table}"' in query['sql'] and 'ORDER BY' in query['sql'])
+        self.assertNotIn('"password"', sql)
+        self.assertNotIn('"email"', sql)
+
+        detail = self.client.get(reverse('user-detail', args=[self.admin.id]) + '?fields=email')
+        self.assertEqual(detail.data, {'email': self.admin.email})
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(url + ',password').status_code, 400)
+
+
+class UserFastReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = seed_users(1, role='admin')[0]
+        cls.users = seed_users(12, created_by=cls.admin)
+
+    def setUp(self):
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_output_matches_serializer(self):
+        user = self.users[0]
+        for url in [
+            reverse('user-list') + '?page_size=500',
+            reverse('user-list') + '?page_size=5&fields=id,created_by,created_at',
+            reverse('user-by-username', args=[user.username]),
+            reverse('user-by-email', args=[self.admin.email]),
+            reverse('user-by-firstname', args=[user.first_name[:3]]),
+        ]:
+            with self.subTest(url=url):
+                fast = self.client.get(url)
+                response_cache().clear()
+                with override_settings(FAST_READS=False):
+                    slow = self.client.get(url)
+                response_cache().clear()
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
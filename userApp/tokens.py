@@ -0,0 +1,27 @@
+# user/tokens.py
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from .revocation import revocations
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    A refresh token whose blacklist check only queries the database when the
+    in-memory revocation set says the token may have been revoked.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if not revocations.might_be_revoked(jti):
+            return
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        revocations.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (
-    index, SignupView, LoginView, UserListView, UserDetailView,
+    index, SignupView, UserImportView, LoginView, UserListView, UserDetailView,
     UserUpdateView, UserDeleteView, UserByUsernameView, UserByEmailView,
     UserByPhoneView, UserByFirstNameView, UserByLastNameView, PasswordResetView,
     UpdateUsernameView, UserCountView, UserTrendView, UserDownloadPDFView, UserDownloadExcelView, LogoutView, CreatedUsersListView, contact_us
@@ -9,6 +9,7 @@ from .views import (
 urlpatterns = [
     path('', index, name='index'),
     path('signup/', SignupView.as_view(), name='signup'),
+    path('users/import/', UserImportView.as_view(), name='user-import'),
     path('login/', LoginView.as_view(), name='login'),
     path('users/', UserListView.as_view(), name='user-list'),
     path('user/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
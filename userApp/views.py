@@ -6,16 +6,38 @@ This file contains views for user operations.
 from django.contrib.auth import authenticate
 from django.http import JsonResponse
 from rest_framework import status, generics
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from .models import CustomUser
+from .imports import import_users, read_rows
+from .models import CustomUser, UserDailyStat
+from .pagination import CreatedAtCursorPagination
 from .serializers import (
     LogoutSerializer, UserSerializer, SignupSerializer, LoginSerializer,
     PasswordResetSerializer, UpdateUsernameSerializer
 )
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RefreshToken
+from datetime import timedelta
+from RRA_report_backend.conditional import collection_state, conditional_get, make_etag
+from RRA_report_backend.fastread import FastReadMixin
+from RRA_report_backend.fieldsets import SparseFieldsetMixin
+from RRA_report_backend.responsecache import cached_get
+from RRA_report_backend.stats import rollup_bucket_counts, rollup_total, rollup_window_counts, series
+
+
+def user_state(view, request, *args, **kwargs):
+    updated = CustomUser.objects.filter(pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+    if updated is None:
+        return None
+    # ?fields= and ?expand= shape the body, so they are part of the tag.
+    return make_etag('user', kwargs['pk'], updated, request.GET.get('fields'), request.GET.get('expand')), updated
+
+
+def user_export_state(view, request, *args, **kwargs):
+    return collection_state(CustomUser.objects.all(), type(view).__name__)
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -47,8 +69,34 @@ class SignupView(generics.CreateAPIView):
         logger.info(f"Request data: {request.data}")
         return super().create(request, *args, **kwargs)
 
-        
-        
+
+
+class UserImportView(APIView):
+    """
+    Create many users from an uploaded CSV or XLSX file (field `file`) with
+    the columns first_name, last_name, email, phone and role. Valid rows
+    are created even if others fail; the response reports every row.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the users file in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = read_rows(upload)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        results = import_users(rows, request.user)
+        created = sum(result['status'] == 'created' for result in results)
+        return Response({
+            "created": created,
+            "failed": len(results) - created,
+            "rows": results,
+        }, status=status.HTTP_200_OK)
+
+
 class LoginView(APIView):
     permission_classes = [AllowAny]
 
@@ -85,16 +133,26 @@ def user_exists(username):
 
 
     
-class UserListView(generics.ListAPIView):
+class UserListView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
-class UserDetailView(generics.RetrieveAPIView):
+    @cached_get(models=[CustomUser], ttl='list')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class UserDetailView(SparseFieldsetMixin, generics.RetrieveAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    @conditional_get(user_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 class UserUpdateView(generics.UpdateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
@@ -105,7 +163,7 @@ class UserDeleteView(generics.DestroyAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
-class UserByUsernameView(generics.ListAPIView):
+class UserByUsernameView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -113,7 +171,7 @@ class UserByUsernameView(generics.ListAPIView):
         username = self.kwargs['username']
         return CustomUser.objects.filter(username=username)
 
-class UserByEmailView(generics.ListAPIView):
+class UserByEmailView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -121,7 +179,7 @@ class UserByEmailView(generics.ListAPIView):
         email = self.kwargs['email']
         return CustomUser.objects.filter(email=email)
 
-class UserByPhoneView(generics.ListAPIView):
+class UserByPhoneView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -129,7 +187,7 @@ class UserByPhoneView(generics.ListAPIView):
         phone = self.kwargs['phone']
         return CustomUser.objects.filter(phone=phone)
 
-class UserByFirstNameView(generics.ListAPIView):
+class UserByFirstNameView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -137,7 +195,7 @@ class UserByFirstNameView(generics.ListAPIView):
         first_name = self.kwargs['first_name']
         return CustomUser.objects.filter(first_name__icontains=first_name)
 
-class UserByLastNameView(generics.ListAPIView):
+class UserByLastNameView(FastReadMixin, SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -183,13 +241,12 @@ class PasswordResetView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def send_credentials(self, email, username, new_password):
-        from django.core.mail import send_mail
-        send_mail(
+        from .outbox import enqueue
+        enqueue(
             'Password Reset for RRA Report Management System',
             f'Hello,\n\nYour password has been reset. Here are your new credentials:\n\nUsername: {username}\nPassword: {new_password}\n\nYou can change these credentials after logging in.\n\nRegards!',
             'from@example.com',
             [email],
-            fail_silently=False,
         )
 
 
@@ -222,33 +279,39 @@ class UpdateUsernameView(APIView):
 class UserCountView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @cached_get(models=[CustomUser], ttl='count')
     def get(self, request):
-        count = CustomUser.objects.count()
+        count = rollup_total(UserDailyStat.objects.all())
         return Response({"count": count}, status=status.HTTP_200_OK)
 
 class UserTrendView(APIView):
     permission_classes = [IsAuthenticated]
 
+    windows = {
+        "daily": timedelta(days=1),
+        "weekly": timedelta(weeks=1),
+        "monthly": timedelta(days=30),
+        "yearly": timedelta(days=365),
+        "five_years": timedelta(days=365*5),
+        "ten_years": timedelta(days=365*10),
+    }
+
+    @cached_get(models=[CustomUser], ttl='trend')
     def get(self, request):
-        from django.utils import timezone
-        from datetime import timedelta
-
-        def get_trend(interval):
-            end_date = timezone.now()
-            start_date = end_date - interval
-            return CustomUser.objects.filter(created_at__range=(start_date, end_date)).count()
-
-        trends = {
-            "daily": get_trend(timedelta(days=1)),
-            "weekly": get_trend(timedelta(weeks=1)),
-            "monthly": get_trend(timedelta(days=30)),
-            "yearly": get_trend(timedelta(days=365)),
-            "five_years": get_trend(timedelta(days=365*5)),
-            "ten_years": get_trend(timedelta(days=365*10)),
-        }
+        # ?bucket=day|week|month&from=&to= returns a histogram instead
+        if 'bucket' in request.query_params:
+            try:
+                data = series(request.query_params, self.bucket_counts)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(data, status=status.HTTP_200_OK)
 
+        trends = rollup_window_counts(UserDailyStat.objects.all(), self.windows)
         return Response(trends, status=status.HTTP_200_OK)
 
+    def bucket_counts(self, bucket, start, end):
+        return rollup_bucket_counts(UserDailyStat.objects.all(), bucket, start, end)
+
 
 
 
@@ -258,13 +321,8 @@ class UserTrendView(APIView):
 
 
 
-import io
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
-from openpyxl import Workbook
-from openpyxl.styles import Alignment
+from exportApp.renderers import pdf_response, xlsx_response
+from .exports import user_dataset
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from .models import CustomUser
@@ -272,79 +330,23 @@ from .models import CustomUser
 class UserDownloadPDFView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_get(user_export_state)
     def get(self, request):
-        users = CustomUser.objects.all()
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="users.pdf"'
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        data = [["ID", "First Name", "Last Name", "Username", "Email", "Phone", "Role", "Created At"]]
-        for user in users:
-            data.append([user.id, user.first_name, user.last_name, user.username, user.email, user.phone, user.role, user.created_at])
-
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(table)
-
-        doc.build(elements)
-        pdf = buffer.getvalue()
-        buffer.close()
-
-        response.write(pdf)
-        return response
+        return pdf_response(user_dataset(), 'users.pdf')
 
 class UserDownloadExcelView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_get(user_export_state)
     def get(self, request):
-        users = CustomUser.objects.all()
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="users.xlsx"'
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Users"
-
-        headers = ["ID", "First Name", "Last Name", "Username", "Email", "Phone", "Role", "Created At"]
-        ws.append(headers)
-
-        for user in users:
-            ws.append([user.id, user.first_name, user.last_name, user.username, user.email, user.phone, user.role, user.created_at])
-
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column].width = adjusted_width
-            ws[column + '1'].alignment = Alignment(horizontal='center', vertical='center')
-
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        response.write(buffer.read())
-        return response
+        return xlsx_response(user_dataset(), 'users.xlsx')
     
     
     
     
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RefreshToken
 from rest_framework.response import Response
 from rest_framework import status
 
@@ -372,22 +374,15 @@ class CreatedUsersListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = CustomUser.objects.filter(created_by=user)
-        
-        # Log the queryset to the terminal for debugging
-        print("Retrieved Users:")
-        for user in queryset:
-            print(f"ID: {user.id}, First Name: {user.first_name}, Last Name: {user.last_name}, Email: {user.email}, Phone: {user.phone}, Role: {user.role}")
-
-        return queryset
+        return CustomUser.objects.filter(created_by=user)
     
     
-from django.core.mail import send_mail
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from .outbox import enqueue
 from .serializers import ContactUsSerializer
 
 @api_view(['POST'])
@@ -413,13 +408,12 @@ def contact_us(request):
         except ValidationError:
             return Response({"error": "Invalid email format."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Sending email
-        send_mail(
+        # Queue the email; the outbox sender delivers it
+        enqueue(
             subject=f"Contact Us: {subject}",
-            message=f"Name: {names}\nEmail: {email}\n\nDescription:\n{description}",
+            body=f"Name: {names}\nEmail: {email}\n\nDescription:\n{description}",
             from_email=email,
-            recipient_list=['princemugabe567@gmail.com'],
-            fail_silently=False,
+            recipients=['princemugabe567@gmail.com'],
         )
         return Response({"message": "Email sent successfully."}, status=status.HTTP_200_OK)
     